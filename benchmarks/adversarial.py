@@ -0,0 +1,188 @@
+# encoding=utf-8
+
+# Searches for the inputs that are slowest per character for each public entry point, and checks
+# that the slowest ones found so far still scale linearly.
+#
+#   python benchmarks/adversarial.py search [--iterations 100] [--max-length 560] [--corpus worst_cases.json]
+#   python benchmarks/adversarial.py check [--corpus worst_cases.json] [--max-growth 3.0] [--tolerance 0.5]
+#
+# search mutates inputs built from the constructs that make the patterns in regex.py backtrack
+# (the TLD alternations, balanced parens in URL paths, HASHTAG_BOUNDARY, mention and list
+# prefixes), keeping the ones that take the most time per character, and merges the worst it
+# finds into the corpus file.
+#
+# check times every input in the corpus at its saved length and at twice that length. An entry
+# point that takes more than max-growth times as long on the doubled input is super-linear on
+# it. Inputs that were already super-linear when they were found (the growth is saved with
+# them) only fail when their growth gets worse by more than the tolerance. Failures make the
+# check exit with status 1.
+import argparse, json, os, random, sys
+from timeit import default_timer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from corpora import generate
+from run import OPERATIONS
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'worst_cases.json')
+
+# pieces of the expensive constructs
+FRAGMENTS = [
+    # domains and TLDs, including near misses of TLDs
+    u'a.', u'ab.', u'a-', u'.co', u'.com', u'.comx', u'.c', u'.xn--', u'.みんな', u'www.', u'http://', u'https://', u'.t.co/',
+    # paths, balanced parens and queries
+    u'/', u'(', u')', u'(a)', u'(a) ', u'?', u'=', u'&', u'!', u'.',
+    # hashtag boundaries and bodies
+    u'#', u'＃', u'&#', u'a#', u'_', u'é', u'日本', u'z',
+    # mentions and lists
+    u'@', u'＠', u'RT:', u'@a/', u'/list',
+    # cashtags and separators
+    u'$', u'$A', u' ', u'　', u'a',
+]
+
+MUTATIONS = ('insert', 'delete', 'replace', 'repeat', 'splice')
+
+def time_per_call(operation, text, minimum = 0.005):
+    """
+    Runs operation(text) until at least minimum seconds have passed and returns the time per call.
+    """
+    calls = 1
+    while True:
+        started = default_timer()
+        for i in xrange(calls):
+            operation(text)
+        elapsed = default_timer() - started
+        if elapsed >= minimum:
+            return elapsed / calls
+        calls *= 2
+
+def mutate(rand, text, max_length):
+    mutation = rand.choice(MUTATIONS)
+    position = rand.randint(0, len(text))
+    if mutation == 'insert' or not text:
+        text = text[:position] + rand.choice(FRAGMENTS) + text[position:]
+    elif mutation == 'delete':
+        text = text[:position] + text[position + rand.randint(1, 4):]
+    elif mutation == 'replace':
+        text = text[:position] + rand.choice(FRAGMENTS) + text[position + 1:]
+    elif mutation == 'repeat':
+        # repeating a piece is how backtracking blowups usually grow
+        end = min(len(text), position + rand.randint(1, 8))
+        text = text[:position] + text[position:end] * rand.randint(2, 16) + text[end:]
+    else:
+        fragment = u''.join([rand.choice(FRAGMENTS) for i in xrange(rand.randint(1, 4))])
+        text = text[:position] + fragment * rand.randint(1, 20) + text[position:]
+    return text[:max_length]
+
+def growth(operation, text):
+    """
+    How many times longer operation takes on text repeated twice than on text.
+    """
+    return time_per_call(operation, text * 2) / time_per_call(operation, text)
+
+def seeds(rand, count, min_length):
+    texts = generate('adversarial', count, rand.randint(0, 1000))
+    for i in xrange(count):
+        texts.append(u''.join([rand.choice(FRAGMENTS) for j in xrange(rand.randint(4, 40))]))
+    # the fixed cost of a call dominates the time per character of short inputs
+    return [text * (min_length / len(text) + 1) for text in texts]
+
+def search(name, operation, rand, iterations, max_length, min_length = 64, population_size = 16, keep = 5):
+    """
+    Returns the keep inputs of at least min_length characters found with the most time per
+    character for operation.
+    """
+    population = []
+    for text in seeds(rand, population_size, min_length):
+        text = text[:max_length]
+        population.append((time_per_call(operation, text) / len(text), text))
+    population.sort(reverse = True)
+    seen = set([text for score, text in population])
+    for iteration in xrange(iterations):
+        # favor the slowest inputs as parents
+        parent = population[min(int(rand.expovariate(0.5)), len(population) - 1)][1]
+        child = mutate(rand, parent, max_length)
+        if len(child) < min_length or child in seen:
+            continue
+        seen.add(child)
+        score = time_per_call(operation, child) / len(child)
+        if score > population[-1][0]:
+            population.append((score, child))
+            population.sort(reverse = True)
+            del population[population_size:]
+    found = []
+    for score, text in population[:keep]:
+        found.append({'operation': name, 'text': text, 'length': len(text), 'seconds_per_char': score, 'growth': growth(operation, text)})
+    return found
+
+def load_corpus(path):
+    if not os.path.exists(path):
+        return []
+    corpus_file = open(path)
+    try:
+        return json.load(corpus_file)
+    finally:
+        corpus_file.close()
+
+def save_corpus(path, entries):
+    corpus_file = open(path, 'w')
+    try:
+        json.dump(entries, corpus_file, indent = 2, sort_keys = True)
+    finally:
+        corpus_file.close()
+
+def command_search(args):
+    rand = random.Random(args.seed)
+    corpus = load_corpus(args.corpus)
+    for name in args.operations.split(','):
+        found = search(name, OPERATIONS[name], rand, args.iterations, args.max_length, args.min_length, keep = args.keep)
+        for entry in found:
+            print '%-32s %8d chars %12.3f us/char  x2 length: %.2fx time  %r' % (name, entry['length'], entry['seconds_per_char'] * 1e6, entry['growth'], entry['text'][:40])
+        sys.stdout.flush()
+        # keep the worst of the old and new inputs for this entry point
+        entries = [entry for entry in corpus if entry['operation'] == name] + found
+        entries.sort(key = lambda entry: -entry['seconds_per_char'])
+        unique = []
+        for entry in entries:
+            if entry['text'] not in [kept['text'] for kept in unique]:
+                unique.append(entry)
+        corpus = [entry for entry in corpus if entry['operation'] != name] + unique[:args.keep]
+    save_corpus(args.corpus, corpus)
+    print 'Saved %d inputs to %s' % (len(corpus), args.corpus)
+
+def command_check(args):
+    failures = []
+    for entry in load_corpus(args.corpus):
+        operation = OPERATIONS[entry['operation']]
+        text = entry['text']
+        single = time_per_call(operation, text)
+        doubled = time_per_call(operation, text * 2)
+        found = doubled / single
+        limit = max(args.max_growth, entry.get('growth', 0) * (1 + args.tolerance))
+        print '%-32s %8d chars %12.3f us/char  x2 length: %.2fx time (limit %.2fx)' % (entry['operation'], len(text), single / len(text) * 1e6, found, limit)
+        if found > limit:
+            failures.append('%s on %r: doubling the input took %.2fx as long' % (entry['operation'], text[:60], found))
+    if failures:
+        sys.stderr.write('Super-linear behaviour:\n  %s\n' % '\n  '.join(failures))
+        sys.exit(1)
+
+def main():
+    parser = argparse.ArgumentParser(description = u'Worst case input search and super-linearity check')
+    parser.add_argument('command', choices = ['search', 'check'])
+    parser.add_argument('--corpus', default = DEFAULT_CORPUS, help = u'JSON file of the worst inputs found')
+    parser.add_argument('--operations', default = ','.join(sorted(OPERATIONS.keys())), help = u'comma separated entry points to search')
+    parser.add_argument('--iterations', type = int, default = 100, help = u'mutations tried per entry point')
+    parser.add_argument('--max-length', type = int, default = 560)
+    parser.add_argument('--min-length', type = int, default = 64)
+    parser.add_argument('--keep', type = int, default = 3, help = u'inputs kept per entry point')
+    parser.add_argument('--seed', type = int, default = 1)
+    parser.add_argument('--max-growth', type = float, default = 3.0, help = u'allowed time growth when the input length doubles')
+    parser.add_argument('--tolerance', type = float, default = 0.5, help = u'allowed increase of the saved growth of known super-linear inputs')
+    args = parser.parse_args()
+    if args.command == 'search':
+        command_search(args)
+    else:
+        command_check(args)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+# encoding=utf-8
+
+# Reproducible synthetic corpora for the benchmarks. Everything is generated offline from a
+# seeded random.Random, so the same name, size and seed always give the same texts.
+import random
+
+ENGLISH = [u'the', u'new', u'release', u'is', u'out', u'today', u'thanks', u'to', u'everyone', u'who', u'helped',
+           u'see', u'you', u'at', u'meetup', u'tonight', u'lol', u'ok', u'great', u'game', u'last', u'night']
+MULTILINGUAL = [u'café', u'niño', u'über', u'ça', u'va', u'привет', u'мир', u'مرحبا', u'بالعالم', u'שלום', u'עולם',
+                u'日本語', u'テスト', u'中文', u'測試', u'한국어', u'시험', u'ภาษาไทย', u'Ελληνικά', u'हिन्दी']
+EMOJI = [u'😀', u'🎉', u'👍🏽', u'❤️', u'🇯🇵', u'👨‍👩‍👧']
+CJK_RTL_HASHTAGS = [u'日本', u'東京', u'ニュース', u'中国', u'한국', u'서울', u'العربية', u'مصر', u'עברית', u'ישראל', u'فارسی']
+URLS = [u'http://example.com', u'https://twitter.com/about', u'http://t.co/abc123', u'www.example.co.uk/path?q=1',
+        u'example.com', u'http://en.wikipedia.org/wiki/Primer_(film)', u'https://example.jp:8080/a/b/c.html#frag',
+        u'https://sub.domain.example.org/search?q=twitter+text&lang=en', u'http://bit.ly/1a2B3c', u'github.com/twitter/twitter-text']
+CASHTAGS = [u'AAPL', u'GOOG', u'TWTR', u'MSFT', u'AMZN']
+
+def _sentence(rand, words, length):
+    return u' '.join([rand.choice(words) for i in xrange(length)])
+
+def chat(rand):
+    # short conversational messages with the occasional mention or emoji
+    parts = [_sentence(rand, ENGLISH, rand.randint(2, 10))]
+    if rand.random() < 0.3:
+        parts.insert(0, u'@friend%d' % rand.randint(1, 50))
+    if rand.random() < 0.3:
+        parts.append(rand.choice(EMOJI))
+    return u' '.join(parts)
+
+def spam(rand):
+    # as many entities as fit in a Tweet
+    parts = []
+    for i in xrange(rand.randint(8, 20)):
+        parts.append(rand.choice([
+            u'#' + rand.choice(ENGLISH),
+            u'@user%d' % rand.randint(1, 1000),
+            u'$' + rand.choice(CASHTAGS),
+            rand.choice(URLS),
+            u'@list%d/members' % rand.randint(1, 10),
+        ]))
+    return u' '.join(parts)
+
+def multilingual(rand):
+    # long texts mixing scripts, with entities here and there
+    parts = []
+    for i in xrange(rand.randint(40, 120)):
+        roll = rand.random()
+        if roll < 0.03:
+            parts.append(rand.choice(URLS))
+        elif roll < 0.06:
+            parts.append(u'#' + rand.choice(MULTILINGUAL))
+        elif roll < 0.08:
+            parts.append(rand.choice(EMOJI))
+        else:
+            parts.append(rand.choice(MULTILINGUAL + ENGLISH))
+    return u' '.join(parts)
+
+def cjk_rtl_hashtags(rand):
+    parts = []
+    for i in xrange(rand.randint(3, 12)):
+        if rand.random() < 0.5:
+            parts.append(rand.choice([u'#', u'＃']) + rand.choice(CJK_RTL_HASHTAGS))
+        else:
+            parts.append(rand.choice(CJK_RTL_HASHTAGS))
+    return rand.choice([u' ', u'　', u'']).join(parts)
+
+def url_heavy(rand):
+    parts = []
+    for i in xrange(rand.randint(2, 8)):
+        parts.append(rand.choice(URLS))
+        parts.append(_sentence(rand, ENGLISH, rand.randint(0, 3)))
+    return u' '.join(parts)
+
+def adversarial(rand):
+    # inputs that make the URL, hashtag and mention patterns backtrack
+    size = rand.randint(40, 120)
+    return rand.choice([
+        u'a.' * size,
+        u'ab.' * size + u'zzzz',
+        u'a-' * size + u'.com',
+        u'http://x.com/' + u'(a) ' * size,
+        u'http://x.com/' + u'(' * size,
+        u'#' + u'a' * size + u'!',
+        u'@' * size + u'a',
+        u'www.' + u'a.' * size + u'co',
+    ])
+
+CORPORA = {
+    'chat':             chat,
+    'spam':             spam,
+    'multilingual':     multilingual,
+    'cjk_rtl_hashtags': cjk_rtl_hashtags,
+    'url_heavy':        url_heavy,
+    'adversarial':      adversarial,
+}
+
+def generate(name, count, seed = 1):
+    """
+    Returns count texts from the named corpus.
+    """
+    rand = random.Random(seed * 100 + sorted(CORPORA.keys()).index(name))
+    generator = CORPORA[name]
+    return [generator(rand) for i in xrange(count)]
@@ -0,0 +1,57 @@
+# encoding=utf-8
+
+# Measures what NFC normalization costs tweet_length on mixed-script corpora.
+#
+#   python benchmarks/normalization.py [--count 2000] [--repeat 3] [--seed 1]
+#
+# For each corpus it times the normalization done by tweet_length (nfc_with_positions), a bare
+# unicodedata.normalize call for comparison, and tweet_length itself, and reports how many texts
+# were already normalized. The decomposed corpora are the multilingual and hashtag ones in NFD,
+# where every text has to be normalized.
+import argparse, os, sys, time, unicodedata
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from corpora import generate
+from twitter_text.unicode import nfc_with_positions
+from twitter_text.validation import Validation
+
+def corpora(count, seed):
+    result = []
+    for name in ('chat', 'spam', 'multilingual', 'cjk_rtl_hashtags'):
+        result.append((name, generate(name, count, seed)))
+    for name in ('multilingual', 'cjk_rtl_hashtags'):
+        result.append((name + ' (NFD)', [unicodedata.normalize('NFD', text) for text in generate(name, count, seed)]))
+    return result
+
+def best_of(repeat, function, texts):
+    best = None
+    for i in xrange(repeat):
+        started = time.time()
+        for text in texts:
+            function(text)
+        elapsed = time.time() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description = u'Measure the cost of NFC normalization in tweet_length')
+    parser.add_argument('--count', type = int, default = 2000)
+    parser.add_argument('--repeat', type = int, default = 3)
+    parser.add_argument('--seed', type = int, default = 1)
+    args = parser.parse_args()
+
+    # builds the pattern used to map positions outside the timings
+    nfc_with_positions(u'é')
+
+    print '%-26s %9s %14s %14s %14s' % ('corpus', 'as is', 'nfc+positions', 'normalize', 'tweet_length')
+    for name, texts in corpora(args.count, args.seed):
+        passed = len([text for text in texts if nfc_with_positions(text)[1] is None])
+        quick = best_of(args.repeat, nfc_with_positions, texts)
+        normalize = best_of(args.repeat, lambda text: unicodedata.normalize('NFC', text), texts)
+        length = best_of(args.repeat, lambda text: Validation(text).tweet_length({}), texts)
+        print '%-26s %8.0f%% %11.2f us %11.2f us %11.2f us' % (name, 100.0 * passed / len(texts),
+            quick / len(texts) * 1e6, normalize / len(texts) * 1e6, length / len(texts) * 1e6)
+
+if __name__ == '__main__':
+    main()
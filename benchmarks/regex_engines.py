@@ -0,0 +1,81 @@
+# encoding=utf-8
+
+# Compares the regex engines in twitter_text.engines on entity extraction throughput.
+#
+#   python benchmarks/regex_engines.py [--tweets 2000] [--repeat 3] [--seed 1]
+#
+# Every available engine runs over the same synthetic corpus, as does the stdlib engine with
+# the linear time URL scanner. Each run's entities are compared with the stdlib results so an
+# engine that is fast because it finds different entities stands out.
+import argparse, os, sys, time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from corpora import generate
+from twitter_text.engines import available_regex_engines, set_regex_engine, REGEX_ENGINES
+from twitter_text.extractor import Extractor
+
+# Letters that only match ASCII letters case-insensitively when a pattern is matched as Unicode:
+# dotted capital I, dotless i, the Kelvin sign and long s. The generated corpora have none of
+# them, so without these an engine matching case differently would still report the same entities.
+CASE_FOLDING = [
+    u'buy $\u0130 and $\u212aB now',
+    u'$\u017fPY or $\u0131BM? #\u212aelvin @\u017fam',
+    u'@j\u0130ck/\u0131ist and #\u0130stanbul',
+    u'see http://\u212aelvin.com/\u017f and www.ex\u0131mple.com/?q=\u0130',
+    u'RT @\u212a\u0130: $A.\u212a $AB_\u017f http://t.co/\u0131\u212a',
+]
+
+def corpus(count, seed):
+    texts = []
+    for name in ('chat', 'spam', 'multilingual', 'url_heavy'):
+        texts.extend(generate(name, count / 4, seed))
+    # a sprinkling of inputs that make valid_url backtrack
+    texts.extend(generate('adversarial', max(1, count / 100), seed))
+    texts.extend(CASE_FOLDING * max(1, count / 200))
+    return texts
+
+def run(texts, options, repeat):
+    best = None
+    for i in xrange(repeat):
+        started = time.time()
+        results = [Extractor(text).extract_entities_with_indices(options) for text in texts]
+        elapsed = time.time() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, results
+
+def main():
+    parser = argparse.ArgumentParser(description = u'Compare regex engines on entity extraction throughput')
+    parser.add_argument('--tweets', type = int, default = 2000)
+    parser.add_argument('--repeat', type = int, default = 3)
+    parser.add_argument('--seed', type = int, default = 1)
+    args = parser.parse_args()
+
+    texts = corpus(args.tweets, args.seed)
+    available = available_regex_engines()
+    options = {'extract_url_without_protocol': True}
+
+    runs = [('re', options)]
+    runs.extend([(name, options) for name in available if name != 're'])
+    runs.append(('re', dict(options, url_engine = 'linear')))
+
+    print '%d texts' % len(texts)
+    print '%-24s %12s %10s %9s  %s' % ('engine', 'texts/sec', 'seconds', 'matches', 'fallbacks')
+    reference = None
+    try:
+        for name, run_options in runs:
+            fallbacks = set_regex_engine(name)
+            elapsed, results = run(texts, run_options, args.repeat)
+            if reference is None:
+                reference = results
+            label = name if 'url_engine' not in run_options else '%s + linear urls' % name
+            print '%-24s %12.0f %10.3f %9s  %s' % (label, len(texts) / elapsed, elapsed, 'yes' if results == reference else 'NO', ', '.join(fallbacks) or '-')
+    finally:
+        set_regex_engine('re')
+
+    for name in REGEX_ENGINES:
+        if name not in available:
+            print '%s is not installed, skipped' % name
+
+if __name__ == '__main__':
+    main()
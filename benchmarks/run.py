@@ -0,0 +1,117 @@
+# encoding=utf-8
+
+# Measures the throughput and memory of the public entry points on the corpora in corpora.py.
+#
+#   python benchmarks/run.py                          # print the results
+#   python benchmarks/run.py --save baseline.json     # and save them as a baseline
+#   python benchmarks/run.py --baseline baseline.json --threshold 0.2
+#
+# With --baseline the run exits with status 1 when any measurement's throughput drops, or its
+# memory growth rises, by more than the threshold (a fraction) compared with the baseline.
+# Baselines are only comparable on the same machine and Python.
+import argparse, json, os, resource, sys, time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from corpora import CORPORA, generate
+from twitter_text.autolink import Autolink
+from twitter_text.extractor import Extractor
+from twitter_text.highlighter import HitHighlighter
+from twitter_text.validation import Validation
+
+def _first_word(text):
+    end = text.find(u' ')
+    return [[0, end if end > 0 else len(text)]]
+
+OPERATIONS = {
+    'extract_entities_with_indices':    lambda text: Extractor(text).extract_entities_with_indices({'extract_url_without_protocol': True}),
+    'extract_urls_with_indices':        lambda text: Extractor(text).extract_urls_with_indices(),
+    'extract_hashtags_with_indices':    lambda text: Extractor(text).extract_hashtags_with_indices(),
+    'extract_mentions_or_lists':        lambda text: Extractor(text).extract_mentions_or_lists_with_indices(),
+    'extract_cashtags_with_indices':    lambda text: Extractor(text).extract_cashtags_with_indices(),
+    'tweet_length':                     lambda text: Validation(text).tweet_length({}),
+    'auto_link':                        lambda text: Autolink(text).auto_link(),
+    'hit_highlight':                    lambda text: HitHighlighter(text).hit_highlight(_first_word(text)),
+}
+
+# memory growth below this many kilobytes is noise
+MEMORY_SLACK_KB = 1024
+
+def max_rss_kb():
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on Mac OS X, kilobytes everywhere else
+    return usage / 1024 if sys.platform == 'darwin' else usage
+
+def measure(operation, texts, repeat):
+    rss = max_rss_kb()
+    best = None
+    for i in xrange(repeat):
+        started = time.time()
+        for text in texts:
+            operation(text)
+        elapsed = time.time() - started
+        best = elapsed if best is None else min(best, elapsed)
+    best = max(best, 1e-9)
+    return {
+        'seconds':          best,
+        'texts_per_sec':    len(texts) / best,
+        'chars_per_sec':    sum([len(text) for text in texts]) / best,
+        'max_rss_kb_delta': max_rss_kb() - rss,
+    }
+
+def compare(results, baseline, threshold):
+    """
+    Returns a description of every measurement that regressed by more than threshold.
+    """
+    regressions = []
+    for key in sorted(results.keys()):
+        if key not in baseline:
+            continue
+        result, previous = results[key], baseline[key]
+        if result['texts_per_sec'] < previous['texts_per_sec'] * (1 - threshold):
+            regressions.append('%s: %.0f texts/sec, baseline %.0f' % (key, result['texts_per_sec'], previous['texts_per_sec']))
+        if result['max_rss_kb_delta'] > previous['max_rss_kb_delta'] * (1 + threshold) + MEMORY_SLACK_KB:
+            regressions.append('%s: memory grew %d KB, baseline %d KB' % (key, result['max_rss_kb_delta'], previous['max_rss_kb_delta']))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description = u'Benchmark twitter_text on synthetic corpora')
+    parser.add_argument('--corpora', default = ','.join(sorted(CORPORA.keys())), help = u'comma separated corpus names')
+    parser.add_argument('--operations', default = ','.join(sorted(OPERATIONS.keys())), help = u'comma separated operation names')
+    parser.add_argument('--count', type = int, default = 500, help = u'texts per corpus')
+    parser.add_argument('--repeat', type = int, default = 3, help = u'runs per measurement, the fastest counts')
+    parser.add_argument('--seed', type = int, default = 1)
+    parser.add_argument('--save', help = u'write the results to this JSON file')
+    parser.add_argument('--baseline', help = u'compare the results with this JSON file')
+    parser.add_argument('--threshold', type = float, default = 0.2, help = u'allowed regression, as a fraction of the baseline')
+    args = parser.parse_args()
+
+    results = {}
+    print '%-18s %-32s %12s %14s %10s' % ('corpus', 'operation', 'texts/sec', 'chars/sec', 'rss +KB')
+    for corpus in args.corpora.split(','):
+        texts = generate(corpus, args.count, args.seed)
+        for name in args.operations.split(','):
+            result = results['%s/%s' % (corpus, name)] = measure(OPERATIONS[name], texts, args.repeat)
+            print '%-18s %-32s %12.0f %14.0f %10d' % (corpus, name, result['texts_per_sec'], result['chars_per_sec'], result['max_rss_kb_delta'])
+            sys.stdout.flush()
+
+    if args.save:
+        output = open(args.save, 'w')
+        try:
+            json.dump({'count': args.count, 'seed': args.seed, 'results': results}, output, indent = 2, sort_keys = True)
+        finally:
+            output.close()
+
+    if args.baseline:
+        baseline = json.load(open(args.baseline))
+        if baseline.get('count') != args.count or baseline.get('seed') != args.seed:
+            sys.stderr.write('The baseline was made with --count %s --seed %s\n' % (baseline.get('count'), baseline.get('seed')))
+            sys.exit(2)
+        regressions = compare(results, baseline['results'], args.threshold)
+        if regressions:
+            sys.stderr.write('Regressions beyond %d%%:\n  %s\n' % (args.threshold * 100, '\n  '.join(regressions)))
+            sys.exit(1)
+        print 'No regressions beyond %d%%' % (args.threshold * 100)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+# encoding=utf-8
+
+# Measures twitter_text.trending against exact counting on a synthetic stream of hashtags with a
+# long tail of distinct values.
+#
+#   python benchmarks/trending.py [--tweets 200000] [--distinct 1000000] [--k 20] [--epsilon 0.0005]
+#
+# Reports throughput, how many of the true top-K were found, the largest overestimate among
+# them relative to the stream size, and the memory held by each approach.
+import argparse, bisect, os, random, sys, time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from twitter_text.cache import estimate_size
+from twitter_text.trending import SlidingTopK
+
+def zipf_stream(count, distinct, seed, exponent = 1.1):
+    rand = random.Random(seed)
+    cumulative = []
+    total = 0.0
+    for rank in xrange(1, distinct + 1):
+        total += 1.0 / rank ** exponent
+        cumulative.append(total)
+    for i in xrange(count):
+        yield u'tag%d' % bisect.bisect_left(cumulative, rand.random() * total)
+
+def main():
+    parser = argparse.ArgumentParser(description = u'Approximate top-K accuracy and throughput')
+    parser.add_argument('--tweets', type = int, default = 200000)
+    parser.add_argument('--distinct', type = int, default = 1000000)
+    parser.add_argument('--k', type = int, default = 20)
+    parser.add_argument('--epsilon', type = float, default = 0.0005)
+    parser.add_argument('--delta', type = float, default = 0.01)
+    parser.add_argument('--seed', type = int, default = 1)
+    args = parser.parse_args()
+
+    keys = list(zipf_stream(args.tweets, args.distinct, args.seed))
+
+    started = time.time()
+    exact = {}
+    for key in keys:
+        exact[key] = exact.get(key, 0) + 1
+    exact_seconds = time.time() - started
+
+    # one bucket covering the whole stream so the results are comparable with exact counting
+    trending = SlidingTopK(args.k, window = 1, bucket_seconds = 1, epsilon = args.epsilon, delta = args.delta)
+    started = time.time()
+    for key in keys:
+        trending.add(key, 0)
+    approximate_seconds = time.time() - started
+
+    true_top = sorted(exact.items(), key = lambda item: -item[1])[:args.k]
+    found = trending.top(args.k, now = 0)
+    found_keys = set([key for key, count in found])
+    recall = len([key for key, count in true_top if key in found_keys]) / float(args.k)
+    overestimate = max([count - exact[key] for key, count in found] or [0])
+
+    sketch = trending.buckets[0].sketch
+    print '%d keys, %d distinct, sketch %dx%d' % (len(keys), len(exact), sketch.width, sketch.depth)
+    print '%-12s %12s %14s' % ('', 'keys/sec', 'memory (bytes)')
+    print '%-12s %12.0f %14d' % ('exact', len(keys) / exact_seconds, estimate_size(exact))
+    print '%-12s %12.0f %14d' % ('count-min', len(keys) / approximate_seconds, sketch.table.itemsize * len(sketch.table) + estimate_size(trending.buckets[0].counts))
+    print 'top-%d recall %.2f, largest overestimate %d (%.5f of the stream, bound %.5f)' % (args.k, recall, overestimate, overestimate / float(len(keys)), args.epsilon)
+
+if __name__ == '__main__':
+    main()
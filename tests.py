@@ -1,6 +1,7 @@
 # encoding=utf-8
 
-import twitter_text, sys, os, json, argparse, re
+import twitter_text, sys, os, json, argparse, re, random, shutil, tempfile
+import twitter_text.engines, twitter_text.index, twitter_text.splitter, twitter_text.utf8
 from twitter_text.unicode import force_unicode
 
 narrow_build = True
@@ -64,6 +65,14 @@ extractor_file.close()
 sys.stdout.write('Testing Extractor\n')
 sys.stdout.flush()
 
+indexed_sections = {
+    'mentions_with_indices':            'extract_mentioned_screen_names_with_indices',
+    'mentions_or_lists_with_indices':   'extract_mentions_or_lists_with_indices',
+    'urls_with_indices':                'extract_urls_with_indices',
+    'hashtags_with_indices':            'extract_hashtags_with_indices',
+    'cashtags_with_indices':            'extract_cashtags_with_indices',
+}
+
 for section in extractor_tests.get('tests'):
     sys.stdout.write('\nTesting Extractor: %s\n' % section)
     sys.stdout.flush()
@@ -85,6 +94,8 @@ for section in extractor_tests.get('tests'):
             assert_equal(extractor.extract_urls(), test)
         elif section == 'urls_with_indices':
             assert_equal(extractor.extract_urls_with_indices(), test)
+            # the linear time scanner has to find exactly the same URLs
+            assert_equal(extractor.extract_urls_with_indices({'extract_url_without_protocol': True, 'url_engine': 'linear'}), test)
         elif section == 'hashtags':
             assert_equal(extractor.extract_hashtags(), test)
         elif section == 'cashtags':
@@ -94,6 +105,94 @@ for section in extractor_tests.get('tests'):
         elif section == 'cashtags_with_indices':
             assert_equal(extractor.extract_cashtags_with_indices(), test)
 
+        method = indexed_sections.get(section)
+        if method:
+            # the same entities behind a character outside the BMP, in code points and UTF-16 code units
+            astral = twitter_text.extractor.Extractor(u'\U0001f600 ' + test.get('text'))
+            entities = getattr(astral, method)()
+            assert_equal(astral.convert_indices(entities, 'codepoint'), {'expected': [dict(entity, indices = [index + 2 for index in entity['indices']]) for entity in test.get('expected')], 'description': test.get('description') + u' (code points)'})
+            if narrow_build:
+                # Python indices already are UTF-16 code units
+                utf16 = entities
+            else:
+                utf16 = [dict(entity, indices = [len(astral.text[:index].encode('utf-16-le')) / 2 for index in entity['indices']]) for entity in entities]
+            assert_equal(astral.convert_indices(entities, 'utf16'), {'expected': utf16, 'description': test.get('description') + u' (UTF-16)'})
+
+        # the lazy API finds what extract_entities_with_indices does, and the predicates agree with it
+        entities = extractor.extract_entities_with_indices()
+        assert_equal(list(extractor.iter_entities()), {'expected': entities, 'description': test.get('description') + u' (iter_entities)'})
+        assert_equal([extractor.has_urls(), extractor.has_hashtags(), extractor.has_mentions(), extractor.has_cashtags()],
+            {'expected': [bool([entity for entity in entities if key in entity]) for key in ('url', 'hashtag', 'screen_name', 'cashtag')], 'description': test.get('description') + u' (has_*)'})
+
+        # the result cache hands out copies, so changing what it returned doesn't change the next result
+        twitter_text.enable_cache()
+        for attempt in xrange(2):
+            for entity in twitter_text.extractor.Extractor(test.get('text')).extract_entities_with_indices():
+                entity['indices'][0] = -1
+                entity['changed'] = True
+        assert_equal(twitter_text.extractor.Extractor(test.get('text')).extract_entities_with_indices(), {'expected': entities, 'description': test.get('description') + u' (cached)'})
+        twitter_text.disable_cache()
+
+# parsed URLs come on copies, whichever order the extractions run in
+sys.stdout.write('\nTesting Extractor: parsed urls\n')
+sys.stdout.flush()
+twitter_text.enable_cache()
+for first, second in [({}, {'parse_urls': True}), ({'parse_urls': True}, {})]:
+    tweet = twitter_text.TwitterText(u'see http://www.BBC.co.uk/news and #python')
+    for method in ['extract_urls_with_indices', 'extract_entities_with_indices']:
+        for options in [first, second, first]:
+            urls = [entity for entity in getattr(tweet.extractor, method)(options) if 'url' in entity]
+            assert_equal([('parsed' in url) for url in urls], {'expected': [bool(options.get('parse_urls'))], 'description': u'%s %r after %r' % (method, options, first)})
+twitter_text.disable_cache()
+
+# the linear time scanner folds case like the regex engine, special cases such as dotless i included
+sys.stdout.write('\nTesting Extractor: url engines\n')
+sys.stdout.flush()
+fuzz = random.Random(1)
+pieces = list(u'ab.cdeio/:=?#-_ ') + [unichr(codepoint) for group in twitter_text.scanner.SRE_CASE_EQUIVALENCES for codepoint in group] + \
+    [u'K', u'\u212a', u'\u0130', u'S', u'http://', u'com', u'co', u'.jp', u'\u03b5\u03bb', u'(', u')']
+mismatches = []
+for i in xrange(5000):
+    text = u''.join([fuzz.choice(pieces) for _ in xrange(fuzz.randint(1, 20))])
+    for without_protocol in (True, False):
+        extractor = twitter_text.extractor.Extractor(text)
+        expected = extractor.extract_urls_with_indices({'extract_url_without_protocol': without_protocol})
+        if extractor.extract_urls_with_indices({'extract_url_without_protocol': without_protocol, 'url_engine': 'linear'}) != expected:
+            mismatches.append(text)
+assert_equal(mismatches, {'expected': [], 'description': u'Linear scanner matches the regex engine on generated text'})
+
+# every installed regex engine matches letters case-insensitively in ASCII only where re does
+sys.stdout.write('\nTesting Extractor: regex engines\n')
+sys.stdout.flush()
+case_folding = [u'buy $\u0130 and $\u212aB now', u'$\u017fPY #\u212aelvin @\u017fam @j\u0130ck/\u0131ist', u'http://\u212aelvin.com/\u017f www.ex\u0131mple.com/?q=\u0130']
+expected = [twitter_text.extractor.Extractor(text).extract_entities_with_indices() for text in case_folding]
+try:
+    for engine in twitter_text.engines.available_regex_engines():
+        twitter_text.engines.set_regex_engine(engine)
+        assert_equal([twitter_text.extractor.Extractor(text).extract_entities_with_indices() for text in case_folding], {'expected': expected, 'description': u'%s engine on non-ASCII case folding' % engine})
+finally:
+    twitter_text.engines.set_regex_engine('re')
+
+# a memoryview searched a window at a time gives what the same bytes in a str do, with windows
+# small enough that stretches without triggers end at all sorts of places in them
+sys.stdout.write('\nTesting Extractor: utf8 buffers\n')
+sys.stdout.flush()
+fuzz = random.Random(3)
+pieces = [u'plain', u'words', u'caf\u00e9', u' ', u' ', u' ', u'\n'] * 10 + [u')', u'#caf\u00e9', u'@jack', u'$AAPL', u'\uff03tag', u'http://example.com/(x) y']
+buf = u''.join([fuzz.choice(pieces) for _ in xrange(20000)]).encode('utf-8')
+whole = twitter_text.utf8.Utf8Extractor(buf)
+expected = whole.extract_entities_with_indices()
+window_size = twitter_text.utf8.WINDOW_SIZE
+try:
+    for size in (64, 100, 257, 4096, window_size):
+        twitter_text.utf8.WINDOW_SIZE = size
+        windowed = twitter_text.utf8.Utf8Extractor(memoryview(buf))
+        assert_equal([region[:2] for region in windowed.regions], {'expected': [region[:2] for region in whole.regions], 'description': u'Regions of a memoryview in windows of %d bytes' % size})
+        assert_equal([dict([(key, value.tobytes() if isinstance(value, memoryview) else value) for key, value in entity.items()]) for entity in windowed.extract_entities_with_indices()],
+            {'expected': expected, 'description': u'Entities of a memoryview in windows of %d bytes' % size})
+finally:
+    twitter_text.utf8.WINDOW_SIZE = window_size
+
 # autolink section
 autolink_file = open(os.path.join('twitter-text-conformance', 'conformance', 'autolink.yml'), 'r')
 autolink_tests = yaml.load(force_unicode(autolink_file.read()))
@@ -122,11 +221,34 @@ for section in autolink_tests.get('tests'):
             assert_equal_without_attribute_order(autolink.auto_link_hashtags(autolink_options), test)
         elif section == 'all':
             assert_equal_without_attribute_order(autolink.auto_link(autolink_options), test)
+            # rendering several formats from one extraction gives the same HTML
+            assert_equal_without_attribute_order(twitter_text.render(test.get('text'), ('html', 'markdown', 'spans'), autolink_options)['html'], test)
         elif section == 'lists':
             assert_equal_without_attribute_order(autolink.auto_link_usernames_or_lists(autolink_options), test)
         elif section == 'json':
             assert_equal_without_attribute_order(autolink.auto_link_with_json(json.loads(test.get('json')), autolink_options), test)
 
+# links don't depend on the URL options of links rendered before them
+sys.stdout.write('\nTesting Autolink: url options\n')
+sys.stdout.flush()
+url_options = {'url_class': 'u', 'url_target': '_blank'}
+twitter_text.autolink.clear_fragment_cache()
+alone = twitter_text.autolink.Autolink(u'@jack #python $AB').auto_link(url_options)
+twitter_text.autolink.clear_fragment_cache()
+twitter_text.autolink.Autolink(u'@jack #python $AB http://example.com').auto_link(url_options)
+after_url = twitter_text.autolink.Autolink(u'@jack #python $AB').auto_link(url_options)
+assert_equal(after_url, {'expected': alone, 'description': u'Links after a URL link with url_class and url_target'})
+assert_equal('target=' in after_url or 'class="u"' in after_url, {'expected': False, 'description': u'url_class and url_target only apply to URLs'})
+
+# render gives the HTML auto_link does with options beyond the conformance ones too, each
+# rendering its links itself rather than taking them from the fragment cache
+for options in [url_options, {'url_class': 'u', 'hashtag_class': 'h', 'symbol_tag': 's', 'username_include_symbol': True}]:
+    for test in autolink_tests.get('tests').get('all'):
+        twitter_text.autolink.clear_fragment_cache()
+        expected = twitter_text.autolink.Autolink(test.get('text')).auto_link(options)
+        twitter_text.autolink.clear_fragment_cache()
+        assert_equal(twitter_text.render(test.get('text'), ('html',), options)['html'], {'expected': expected, 'description': u'%s (render with %r)' % (test.get('description'), options)})
+
 # hit_highlighting section
 hit_highlighting_file = open(os.path.join('twitter-text-conformance', 'conformance', 'hit_highlighting.yml'), 'r')
 hit_highlighting_tests = yaml.load(force_unicode(hit_highlighting_file.read()))
@@ -156,6 +278,12 @@ except ValueError:
     sys.stdout.write('\nValidation tests were skipped because of wide character issues\n')
     sys.stdout.flush()
 
+# the sections counted with each weighting configuration, 'lengths' being the classic count of v1
+weighted_sections = {
+    'WeightedTweetsCounterTest':                    'v2',
+    'WeightedTweetsWithDiscountedEmojiCounterTest': 'v3',
+}
+
 if validate_tests:
     sys.stdout.write('\nTesting Validation\n')
     sys.stdout.flush()
@@ -174,6 +302,101 @@ if validate_tests:
                 assert_equal(validator.valid_hashtag(), test)
             elif section == 'urls':
                 assert_equal(validator.valid_url(), test)
+            elif section == 'lengths':
+                assert_equal(validator.tweet_length({'config': 'v1'}), test)
+            elif section in weighted_sections:
+                config = weighted_sections[section]
+                expected = test.get('expected')
+                assert_equal([validator.tweet_length({'config': config}), not validator.tweet_invalid({'config': config})],
+                    {'expected': [expected.get('weightedLength'), expected.get('valid')], 'description': test.get('description')})
+
+        kind = {'usernames': 'username', 'lists': 'list', 'hashtags': 'hashtag', 'urls': 'url'}.get(section)
+        if kind:
+            texts = [test.get('text') for test in validate_tests.get('tests').get(section)]
+            valid, reasons = twitter_text.validation.bulk_validate(texts, kind)
+            for test, result in zip(validate_tests.get('tests').get(section), valid):
+                assert_equal(result, test)
+
+# emoji sequences count as one default-weight character (2) in v3, their code points in v1
+sys.stdout.write('\nTesting Validation: configurations\n')
+sys.stdout.flush()
+for sequence in [u'\U0001f468\u200d\U0001f469\u200d\U0001f467\u200d\U0001f466', u'\U0001f1ef\U0001f1f5', u'\U0001f44d\U0001f3fd', u'1\ufe0f\u20e3', u'\u2764\ufe0f']:
+    validator = twitter_text.validation.Validation(sequence)
+    assert_equal(validator.tweet_length({'config': 'v3'}), {'expected': 2, 'description': u'Emoji sequence %r in v3' % sequence})
+    assert_equal([not twitter_text.validation.Validation(sequence * count).tweet_invalid({'config': 'v3'}) for count in (140, 141)], {'expected': [True, False], 'description': u'140 emoji sequences %r fit in v3' % sequence})
+    if not narrow_build:
+        assert_equal(validator.tweet_length({'config': 'v1'}), {'expected': len(sequence), 'description': u'Emoji sequence %r in v1' % sequence})
+assert_equal([not twitter_text.validation.Validation(u'a' * count).tweet_invalid({'config': config}) for config in ('v1', 'v2') for count in (140, 141)],
+    {'expected': [True, False, True, True], 'description': u'140 characters fit in v1 and more in v2'})
+
+# splitting section
+sys.stdout.write('\nTesting Splitter\n')
+sys.stdout.flush()
+
+fuzz = random.Random(2)
+words = [u'word', u'longer', u'\u65e5\u672c\u8a9e', u'caf\u00e9', u'e\u0301', u'\U0001f600', u'\U0001f468\u200d\U0001f469\u200d\U0001f467',
+    u'http://example.com/a/path', u'https://t.co/abc123', u'example.org', u'@jack', u'@jack/list', u'#hashtag', u'#\u65e5\u672c', u'$AAPL', u'\n']
+for config in ('v1', 'v2', 'v3'):
+    for limit in (None, 60):
+        text = u' '.join([fuzz.choice(words) for _ in xrange(300)])
+        splitter = twitter_text.splitter.Splitter(text, {'config': config})
+        segments = splitter.split(limit)
+        limit = limit or twitter_text.weighting.get_config(config).max_length
+        description = u'Split with config %s into segments of %d' % (config, limit)
+        assert_equal([segment for segment in segments if twitter_text.validation.Validation(segment).tweet_invalid({'config': config})], {'expected': [], 'description': description + u' that are valid'})
+        assert_equal([segment for segment in segments if twitter_text.validation.Validation(segment).tweet_length({'config': config}) > limit], {'expected': [], 'description': description + u' that fit'})
+
+        # without their counters the segments are the text cut at breaks between entities
+        bodies = [segment[:segment.rindex(u' (')] for segment in segments]
+        position = 0
+        breaks = []
+        for body in bodies:
+            position = splitter.text.index(body, position)
+            breaks.append(position)
+            position += len(body)
+            breaks.append(position)
+        assert_equal(re.sub(ur'\s', u'', u''.join(bodies)), {'expected': re.sub(ur'\s', u'', splitter.text), 'description': description + u' that join to the text'})
+        cut = [entity for entity in twitter_text.extractor.Extractor(splitter.text).extract_entities_with_indices({'extract_url_without_protocol': True})
+            if [index for index in breaks if entity['indices'][0] < index < entity['indices'][1]]]
+        assert_equal(cut, {'expected': [], 'description': description + u' without cutting entities'})
+
+        truncated = splitter.truncate(limit, u'\u2026')
+        assert_equal(splitter.text.startswith(truncated[:-1]) and not twitter_text.validation.Validation(truncated).tweet_invalid({'config': config}),
+            {'expected': True, 'description': u'Truncate with config %s to %d' % (config, limit)})
+
+# a text that fits in one segment isn't numbered
+assert_equal(twitter_text.splitter.split_thread(u'hello world'), {'expected': [u'hello world'], 'description': u'Split a text that fits without numbering it'})
+
+# segments cut inside words, where a slice can end in a URL the whole text doesn't have, still fit
+pieces = [u'foo.cool', u'foo.co', u'ab.co.uk', u'a.com/b', u'xxxxxxx', u'\u65e5\u672c\u8a9e', u'http://example.com/(x) y']
+for number in xrange(20):
+    text = u''.join([fuzz.choice(pieces) for _ in xrange(30)])
+    segments = twitter_text.splitter.split_thread(text, 40, None, {'config': 'v1'})
+    assert_equal([segment for segment in segments if twitter_text.validation.Validation(segment).tweet_length({'config': 'v1'}) > 40],
+        {'expected': [], 'description': u'Split text without whitespace into segments that fit (%d)' % number})
+
+# index section
+sys.stdout.write('\nTesting Index\n')
+sys.stdout.flush()
+directory = tempfile.mkdtemp()
+try:
+    # 64 bit tweet ids and keys too long for a 16 bit length survive the varint encoding
+    tweets = [(2 ** 62 + number * 977, u'#python %s @jack http://Example.com/%d #%s' % (u'x' * number, number, u'k' * 70000)) for number in xrange(300)]
+    expected = {}
+    for tweet_id, text in tweets:
+        for key, start in twitter_text.index.entity_keys(text):
+            expected.setdefault(key, []).append((tweet_id, start))
+    path = twitter_text.index.build_index(tweets, os.path.join(directory, 'tweets.idx'), shard_size = 128)
+    reader = twitter_text.index.IndexReader(path)
+    try:
+        assert_equal(dict(reader.items()), {'expected': expected, 'description': u'Index round trip through merged shards'})
+        assert_equal(reader.tweet_ids('domains', u'EXAMPLE.com'), {'expected': [tweet_id for tweet_id, text in tweets], 'description': u'Index lookup by domain'})
+    finally:
+        reader.close()
+    # four postings a tweet of at most four bytes each, the long key and some room for the rest
+    assert_equal(os.path.getsize(path) < len(tweets) * 4 * 4 + 70000 + 1000, {'expected': True, 'description': u'Index postings take a few bytes each'})
+finally:
+    shutil.rmtree(directory)
 
 sys.stdout.write(u'\033[0m-------\n\033[92m%d tests passed.\033[0m\n' % attempted)
 sys.stdout.flush()
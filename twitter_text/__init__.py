@@ -1,10 +1,13 @@
 # encoding=utf-8
 
+from twitter_text.analysis import TextAnalysis
 from twitter_text.autolink import Autolink
 from twitter_text.extractor import Extractor
 from twitter_text.highlighter import HitHighlighter
+from twitter_text.renderers import render
 from twitter_text.validation import Validation
 from twitter_text.unicode import force_unicode
+from twitter_text.cache import enable_cache, disable_cache, cache_stats
 
 class TwitterText(object):
     def __init__(self, text):
@@ -14,6 +17,7 @@ class TwitterText(object):
         self.tweet_length = None # gets changed by validation method
         self.tweet_is_valid = None # gets changed by validation method
         self.validation_error = None # gets changed by validation method
+        self._analysis = None
         
     def __unicode__(self):
         return self.text
@@ -21,18 +25,31 @@ class TwitterText(object):
     def __repr__(self):
         return self.__unicode__()
     
+    @property
+    def analysis(self):
+        # shared by all the sub-components until self.text is replaced
+        if self._analysis is None or self._analysis.text is not self.text:
+            self._analysis = TextAnalysis(self.text)
+        return self._analysis
+
     @property
     def autolink(self):
-        return Autolink(self.text, parent = self)
+        return Autolink(self.text, parent = self, analysis = self.analysis)
         
     @property
     def extractor(self):
-        return Extractor(self.text)
+        return Extractor(self.text, analysis = self.analysis)
         
     @property
     def highlighter(self):
-        return HitHighlighter(self.text, parent = self)
+        return HitHighlighter(self.text, parent = self, analysis = self.analysis)
         
     @property
     def validation(self):
-        return Validation(self.text, parent = self)
\ No newline at end of file
+        return Validation(self.text, parent = self, analysis = self.analysis)
+
+    def render(self, formats = ('html',), options = {}):
+        """
+        Renders the text in several formats from one extraction, see twitter_text.renderers.render.
+        """
+        return render(self.text, formats, options, analysis = self.analysis)
\ No newline at end of file
@@ -0,0 +1,180 @@
+# encoding=utf-8
+
+# Coroutine versions of extraction, validation and autolinking for asyncio applications.
+#
+# Python 2 has no asyncio, so this module uses trollius, its backport, which comes with the
+# futures backport of concurrent.futures:
+#
+#   pip install trollius
+#
+# The work is CPU bound, so it runs in an executor instead of on the event loop. Requests that
+# arrive close together are grouped into micro-batches, one executor job per batch, which keeps
+# the scheduling overhead per Tweet low without holding a request back for more than
+# max_batch_delay seconds.
+try:
+    import trollius as asyncio
+    from trollius import From, Return
+    from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+except ImportError:
+    raise ImportError('twitter_text.aio needs trollius, the asyncio backport for Python 2: pip install trollius')
+
+from twitter_text.autolink import Autolink
+from twitter_text.cache import copy_entities, options_key
+from twitter_text.extractor import Extractor
+from twitter_text.unicode import force_unicode
+from twitter_text.validation import Validation
+
+DEFAULT_MAX_BATCH_SIZE = 32
+DEFAULT_MAX_BATCH_DELAY = 0.001
+
+def _extract_entities_with_indices(text, options):
+    return Extractor(text).extract_entities_with_indices(options)
+
+def _tweet_length(text, options):
+    return Validation(text).tweet_length(dict(options))
+
+def _tweet_invalid(text, options):
+    return Validation(text).tweet_invalid(options)
+
+def _auto_link(text, options):
+    return Autolink(text).auto_link(options)
+
+OPERATIONS = {
+    'extract_entities_with_indices':    _extract_entities_with_indices,
+    'tweet_length':                     _tweet_length,
+    'tweet_invalid':                    _tweet_invalid,
+    'auto_link':                        _auto_link,
+}
+
+def run_batch(batch):
+    """
+    Runs a batch of (operation, text, options) requests in an executor and returns a (True,
+    result) or (False, exception) pair for each, so one bad Tweet doesn't fail the whole batch.
+    Requests for the same operation on the same text with equal options, such as retweets,
+    are run once. Module level so process pools can pickle it.
+    """
+    results = []
+    done = {}
+    for operation, text, options in batch:
+        key = options_key(options)
+        if key is not None:
+            key = (operation, text, key)
+            if key in done:
+                succeeded, value = done[key]
+                results.append((succeeded, copy_entities(value) if succeeded and isinstance(value, list) else value))
+                continue
+        try:
+            result = (True, OPERATIONS[operation](text, options))
+        except Exception, e:
+            result = (False, e)
+        if key is not None:
+            done[key] = result
+        results.append(result)
+    return results
+
+class AsyncTwitterText(object):
+    """
+    Runs Extractor, Validation and Autolink work off the event loop.
+
+    executor is 'thread' (the default), 'process' or a concurrent.futures executor to share.
+    A process pool keeps the work from competing with the event loop for the GIL, which keeps
+    the latency of other handlers steady under load, but options then can't contain callables.
+
+    Every coroutine takes an optional timeout in seconds (defaulting to the one given here)
+    and raises asyncio.TimeoutError when it runs out. A request that is cancelled or times
+    out before its batch is handed to the executor is dropped from the batch.
+    """
+
+    def __init__(self, executor = 'thread', max_workers = 4, max_batch_size = DEFAULT_MAX_BATCH_SIZE, max_batch_delay = DEFAULT_MAX_BATCH_DELAY, timeout = None, loop = None):
+        self.loop = loop or asyncio.get_event_loop()
+        self.max_batch_size = max_batch_size
+        self.max_batch_delay = max_batch_delay
+        self.timeout = timeout
+        self._owns_executor = executor in ('thread', 'process')
+        if executor == 'thread':
+            self.executor = ThreadPoolExecutor(max_workers)
+        elif executor == 'process':
+            self.executor = ProcessPoolExecutor(max_workers)
+        else:
+            self.executor = executor
+        self._pending = []
+        self._flush_handle = None
+
+    @asyncio.coroutine
+    def extract_entities_with_indices(self, text, options = {}, timeout = None):
+        result = yield From(self._call('extract_entities_with_indices', text, options, timeout))
+        raise Return(result)
+
+    @asyncio.coroutine
+    def tweet_length(self, text, options = {}, timeout = None):
+        result = yield From(self._call('tweet_length', text, options, timeout))
+        raise Return(result)
+
+    @asyncio.coroutine
+    def tweet_invalid(self, text, options = {}, timeout = None):
+        result = yield From(self._call('tweet_invalid', text, options, timeout))
+        raise Return(result)
+
+    @asyncio.coroutine
+    def auto_link(self, text, options = {}, timeout = None):
+        result = yield From(self._call('auto_link', text, options, timeout))
+        raise Return(result)
+
+    def close(self):
+        """
+        Sends off any waiting requests and shuts down the executor if it was created here.
+        """
+        self._flush()
+        if self._owns_executor:
+            self.executor.shutdown(wait = False)
+
+    @asyncio.coroutine
+    def _call(self, operation, text, options, timeout):
+        future = self._submit(operation, text, options)
+        if timeout is None:
+            timeout = self.timeout
+        if timeout is None:
+            result = yield From(future)
+        else:
+            result = yield From(asyncio.wait_for(future, timeout, loop = self.loop))
+        raise Return(result)
+
+    def _submit(self, operation, text, options):
+        future = asyncio.Future(loop = self.loop)
+        self._pending.append((operation, force_unicode(text), options, future))
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = self.loop.call_later(self.max_batch_delay, self._flush)
+        return future
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch = [request for request in self._pending if not request[3].done()]
+        self._pending = []
+        if not batch:
+            return
+        done = self.loop.run_in_executor(self.executor, run_batch, [request[:3] for request in batch])
+        done.add_done_callback(lambda done: self._resolve(batch, done))
+
+    def _resolve(self, batch, done):
+        futures = [request[3] for request in batch]
+        if done.cancelled():
+            for future in futures:
+                future.cancel()
+            return
+        if done.exception() is not None:
+            for future in futures:
+                if not future.done():
+                    future.set_exception(done.exception())
+            return
+        for future, (succeeded, value) in zip(futures, done.result()):
+            # the caller may have timed out or been cancelled in the meantime
+            if future.done():
+                continue
+            if succeeded:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
@@ -0,0 +1,64 @@
+# encoding=utf-8
+
+from twitter_text.extractor import Extractor
+from twitter_text.validation import Validation, url_entities
+from twitter_text.unicode import force_unicode
+
+class TextAnalysis(object):
+    """
+    Lazily populated results for a single text, shared by the Autolink, Extractor, HitHighlighter
+    and Validation objects created from it. Normalizing the text, scanning for trigger characters,
+    extracting entities and weighing the characters are each done at most once, no matter how
+    many components use the analysis.
+    """
+
+    def __init__(self, text):
+        self.text = force_unicode(text)
+        self._triggers = None
+        self._results = {}
+        self.provided_entities = None
+
+    def provide_entities(self, entities, index_unit = 'python'):
+        """
+        Hands the analysis URL entities that are already known, such as the ones in a Twitter API
+        payload or from an earlier extraction, so that Validation uses them instead of extracting
+        URLs again. entities is a list of entities or an API style dict with a 'urls' list, with
+        indices in index_unit ('python', 'utf16' or 'codepoint'). Lengths already measured are
+        forgotten, since they were counted with other URLs.
+        """
+        self.provided_entities = url_entities(self.text, entities, index_unit)
+        for key in self._results.keys():
+            if isinstance(key, tuple) and key[0] == 'tweet_length':
+                del self._results[key]
+
+    @property
+    def triggers(self):
+        """
+        The set of entity types (see Extractor.TRIGGERS) whose trigger characters appear in the text.
+        """
+        if self._triggers is None:
+            chars = frozenset(self.text)
+            self._triggers = frozenset([kind for kind, triggers in Extractor.TRIGGERS.iteritems() if not chars.isdisjoint(triggers)])
+        return self._triggers
+
+    def may_contain(self, kind):
+        return kind in self.triggers
+
+    def memoize(self, key, compute, copy = None):
+        """
+        Returns the result of compute() stored under key, computing it on first use. If copy is
+        given the stored result is passed through it so callers can modify what they get back.
+        """
+        try:
+            result = self._results[key]
+        except KeyError:
+            result = self._results[key] = compute()
+        return copy(result) if copy else result
+
+    @property
+    def entities(self):
+        return Extractor(self.text, analysis = self).extract_entities_with_indices()
+
+    @property
+    def weighted_length(self):
+        return Validation(self.text, analysis = self).tweet_length()
@@ -2,6 +2,7 @@
 
 import re, cgi
 
+from twitter_text.cache import cached, options_key, LRUCache
 from twitter_text.regex import REGEXEN
 from twitter_text.unicode import force_unicode
 from twitter_text.extractor import Extractor
@@ -83,14 +84,39 @@ BOOLEAN_ATTRIBUTES = (
     'checked',
 )
 
+# Options that only change how URLs are linked, left out of the key of the fragment cache
+URL_ONLY_OPTIONS = (
+    'url_class',
+    'url_target',
+    'url_entities',
+    'link_url_transform',
+    'invisible_tag_attrs',
+)
+
+FRAGMENT_CACHE_SIZE = 10000
+
+# Rendered username, list, hashtag and cashtag links by entity, symbol and options
+_fragment_cache = LRUCache(FRAGMENT_CACHE_SIZE)
+
+def fragment_cache_stats():
+    """
+    Returns the hit-rate statistics of the cache of rendered links.
+    """
+    return _fragment_cache.stats()
+
+def clear_fragment_cache():
+    _fragment_cache.clear()
+
 def default_transform(entity, text):
     return text
 
 class Autolink(object):
     def __init__(self, text, **kwargs):
-        self.text = force_unicode(text)
+        self.analysis = kwargs.get('analysis')
+        self.text = self.analysis.text if self.analysis is not None else force_unicode(text)
         self.parent = kwargs.get('parent', False)
-        self.extractor = Extractor(self.text)
+        self.extractor = Extractor(self.text, analysis = self.analysis)
+        self._fragment_options = None
 
     def auto_link_with_json(self, json_obj, options = {}):
         # concantenate entities
@@ -112,12 +138,7 @@ class Autolink(object):
         if not self.text:
             return self.text
 
-        # NOTE deprecate these attributes not options keys in options hash, then use html_attrs
-        options = dict(DEFAULT_OPTIONS.items() + options.items())
-        options['html_attrs'] = self._extract_html_attrs_from_options(options)
-        if not options.get('suppress_no_follow', False):
-            options['html_attrs']['rel'] = "nofollow"
-
+        options = self._prepare_options(options)
         entities.sort(key = lambda entity: entity['indices'][0], reverse = True)
         chars = self.text
 
@@ -159,7 +180,8 @@ class Autolink(object):
         @link_attribute_transform   function to modify the attributes of a link based on the entity. called with |entity, attributes| params, and should modify the attributes hash.
         @link_text_transform        function to modify the text of a link based on the entity. called with (entity, text) params, and should return a modified text.
         """
-        return self.auto_link_entities(self.extractor.extract_entities_with_indices({'extract_url_without_protocol': False}), options)
+        return cached('auto_link', self.text, options,
+            lambda: self.auto_link_entities(self.extractor.extract_entities_with_indices({'extract_url_without_protocol': False}), options))
 
     def auto_link_usernames_or_lists(self, options = {}):
         """
@@ -235,13 +257,41 @@ class Autolink(object):
         return self.auto_link_entities(self.extractor.extract_urls_with_indices({'extract_url_without_protocol': False}), options)
 
     # begin private methods
+    def _prepare_options(self, options = {}):
+        """
+        Returns the options merged with the defaults and with the HTML attributes collected in
+        html_attrs, and remembers which links can be cached with them.
+        """
+        # NOTE deprecate these attributes not options keys in options hash, then use html_attrs
+        options = dict(DEFAULT_OPTIONS.items() + options.items())
+        options['html_attrs'] = self._extract_html_attrs_from_options(options)
+        if not options.get('suppress_no_follow', False):
+            options['html_attrs']['rel'] = "nofollow"
+        self._fragment_options = self._fragment_options_key(options)
+        return options
+
+    def _entity_link(self, entity, symbol, options = {}):
+        """
+        Returns the link for an entity, symbol being the first character of the entity in the text.
+        The options must have been through _prepare_options.
+        """
+        if 'url' in entity:
+            return self._url_link(entity, options)
+        if 'hashtag' in entity:
+            return self._cached_link('hashtag', entity['hashtag'], symbol, lambda: self._hashtag_link(entity, symbol, options))
+        if 'screen_name' in entity:
+            value = (entity['screen_name'], entity.get('list_slug') or '')
+            return self._cached_link('screen_name', value, symbol, lambda: self._screen_name_link(entity, symbol, options))
+        return self._cached_link('cashtag', entity['cashtag'], symbol, lambda: self._cashtag_link(entity, symbol, options))
+
     def _html_escape(self, text):
         for char in HTML_ENTITIES:
             text = text.replace(char, HTML_ENTITIES[char])
         return text
 
     def _extract_html_attrs_from_options(self, options = {}):
-        html_attrs = options.get('html_attrs', {})
+        # a copy, so neither the caller's html_attrs nor the prepared options are changed
+        html_attrs = options.get('html_attrs', {}).copy()
         options = options.copy()
         if 'html_attrs' in options:
             del(options['html_attrs'])
@@ -250,6 +300,32 @@ class Autolink(object):
                 html_attrs[option] = options[option]
         return html_attrs
 
+    def _fragment_options_key(self, options):
+        """
+        The part of the key of cached links that comes from the options, or None when links must
+        not be cached because an option is a callable (a transform might return something different
+        every time) or can't be hashed.
+        """
+        key_options = {}
+        for key in options:
+            if not key in URL_ONLY_OPTIONS and key != 'html_attrs':
+                key_options[key] = options[key]
+        key = options_key(key_options)
+        attrs_key = options_key(options.get('html_attrs', {}))
+        if key is None or attrs_key is None:
+            return None
+        return key, attrs_key
+
+    def _cached_link(self, kind, value, symbol, render):
+        if self._fragment_options is None:
+            return render()
+        key = (kind, value, symbol, self._fragment_options)
+        link = _fragment_cache.get(key)
+        if link is None:
+            link = render()
+            _fragment_cache.set(key, link)
+        return link
+
     def _url_entities_hash(self, url_entities):
         entities = {}
         for entity in url_entities:
@@ -257,6 +333,10 @@ class Autolink(object):
         return entities
 
     def _link_to_url(self, entity, chars, options = {}):
+        link = self._url_link(entity, options)
+        return chars[:entity['indices'][0]] + link + chars[entity['indices'][1]:]
+
+    def _url_link(self, entity, options = {}):
         url = entity.get('url')
 
         href = options.get('link_url_transform', lambda x: x)(url)
@@ -281,8 +361,7 @@ class Autolink(object):
         else:
             link_text = self._html_escape(url)
 
-        link = self._link_to_text(entity, link_text, href, html_attrs, options)
-        return chars[:entity['indices'][0]] + link + chars[entity['indices'][1]:]
+        return self._link_to_text(entity, link_text, href, html_attrs, options)
 
     def _link_url_with_entity(self, entity, options = {}):
         """
@@ -349,7 +428,10 @@ class Autolink(object):
             return self._html_escape(display_url)
 
     def _link_to_hashtag(self, entity, chars, options = {}):
-        hashchar = chars[entity['indices'][0]]
+        link = self._entity_link(entity, chars[entity['indices'][0]], options)
+        return chars[:entity['indices'][0]] + link + chars[entity['indices'][1]:]
+
+    def _hashtag_link(self, entity, hashchar, options = {}):
         hashtag = entity['hashtag']
         hashtag_class = options.get('hashtag_class')
 
@@ -365,11 +447,13 @@ class Autolink(object):
             'title':    u'#%s' % hashtag,
         }
 
-        link = self._link_to_text_with_symbol(entity, hashchar, hashtag, href, html_attrs, options)
-        return chars[:entity['indices'][0]] + link + chars[entity['indices'][1]:]
+        return self._link_to_text_with_symbol(entity, hashchar, hashtag, href, html_attrs, options)
 
     def _link_to_cashtag(self, entity, chars, options = {}):
-        dollar = chars[entity['indices'][0]]
+        link = self._entity_link(entity, chars[entity['indices'][0]], options)
+        return chars[:entity['indices'][0]] + link + chars[entity['indices'][1]:]
+
+    def _cashtag_link(self, entity, dollar, options = {}):
         cashtag = entity['cashtag']
 
         href = options.get('cashtag_url_transform', lambda ct: u'%s%s' % (options.get('cashtag_url_base'), ct))(cashtag)
@@ -380,16 +464,17 @@ class Autolink(object):
         }
         html_attrs.update(options.get('html_attrs', {}))
 
-        link = self._link_to_text_with_symbol(entity, dollar, cashtag, href, html_attrs, options)
-        return chars[:entity['indices'][0]] + link + chars[entity['indices'][1]:]
+        return self._link_to_text_with_symbol(entity, dollar, cashtag, href, html_attrs, options)
 
     def _link_to_screen_name(self, entity, chars, options = {}):
+        link = self._entity_link(entity, chars[entity['indices'][0]], options)
+        return chars[:entity['indices'][0]] + link + chars[entity['indices'][1]:]
+
+    def _screen_name_link(self, entity, at, options = {}):
         name = u'%s%s' % (entity['screen_name'], entity.get('list_slug') or '')
         chunk = options.get('link_text_transform', default_transform)(entity, name)
         name = name.lower()
 
-        at = chars[entity['indices'][0]]
-
         html_attrs = options.get('html_attrs', {}).copy()
         if 'title' in html_attrs:
             del(html_attrs['title'])
@@ -401,8 +486,7 @@ class Autolink(object):
             href = options.get('username_url_transform', lambda sn: u'%s%s' % (options.get('username_url_base'), sn))(name)
             html_attrs['class'] = options.get('username_class')
 
-        link = self._link_to_text_with_symbol(entity, at, chunk, href, html_attrs, options)
-        return chars[:entity['indices'][0]] + link + chars[entity['indices'][1]:]
+        return self._link_to_text_with_symbol(entity, at, chunk, href, html_attrs, options)
 
     def _link_to_text_with_symbol(self, entity, symbol, text, href, attributes = {}, options = {}):
         tagged_symbol = u'<%s>%s</%s>' % (options.get('symbol_tag'), symbol, options.get('symbol_tag')) if options.get('symbol_tag') else symbol
@@ -0,0 +1,193 @@
+# encoding=utf-8
+
+import sys, threading
+
+DEFAULT_MAX_ENTRIES = 10000
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+
+# indexes into the linked list nodes used by LRUCache
+PREV, NEXT, KEY, VALUE, SIZE = 0, 1, 2, 3, 4
+
+def estimate_size(obj):
+    """
+    Rough estimate of the memory held by obj. Only recurses into the container types
+    produced by this library (lists, tuples and dicts of strings and numbers).
+    """
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        for key, value in obj.iteritems():
+            size += estimate_size(key) + estimate_size(value)
+    elif isinstance(obj, (list, tuple)):
+        for item in obj:
+            size += estimate_size(item)
+    return size
+
+def copy_entities(entities):
+    """
+    Returns a copy of a list of entities that shares nothing mutable with the original.
+    """
+    return [_copy_value(entity) for entity in entities]
+
+def _copy_value(value):
+    if isinstance(value, dict):
+        return dict([(key, _copy_value(item)) for key, item in value.iteritems()])
+    if isinstance(value, list):
+        return [_copy_value(item) for item in value]
+    return value
+
+class LRUCache(object):
+    """
+    A bounded, thread-safe mapping that evicts the least recently used entries once it holds
+    more than max_entries items or, if max_bytes is set, more than max_bytes as estimated by
+    the sizeof callable.
+    """
+
+    def __init__(self, max_entries = DEFAULT_MAX_ENTRIES, max_bytes = None, sizeof = None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof or (lambda key, value: estimate_size(key) + estimate_size(value))
+        self._lock = threading.Lock()
+        self._data = {}
+        self._root = []
+        self._root[:] = [self._root, self._root, None, None, 0]
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key, default = None):
+        self._lock.acquire()
+        try:
+            node = self._data.get(key)
+            if node is None:
+                self.misses += 1
+                return default
+            self.hits += 1
+            # move the node to the most recently used end of the list
+            node[PREV][NEXT] = node[NEXT]
+            node[NEXT][PREV] = node[PREV]
+            last = self._root[PREV]
+            last[NEXT] = self._root[PREV] = node
+            node[PREV], node[NEXT] = last, self._root
+            return node[VALUE]
+        finally:
+            self._lock.release()
+
+    def set(self, key, value):
+        size = self.sizeof(key, value) if self.max_bytes else 0
+        if self.max_bytes and size > self.max_bytes:
+            # would evict everything else and still not fit
+            return
+        self._lock.acquire()
+        try:
+            if key in self._data:
+                self._unlink(self._data.pop(key))
+            last = self._root[PREV]
+            node = [last, self._root, key, value, size]
+            last[NEXT] = self._root[PREV] = self._data[key] = node
+            self.bytes += size
+            while len(self._data) > self.max_entries or (self.max_bytes and self.bytes > self.max_bytes):
+                oldest = self._root[NEXT]
+                del self._data[oldest[KEY]]
+                self._unlink(oldest)
+                self.evictions += 1
+        finally:
+            self._lock.release()
+
+    def clear(self):
+        self._lock.acquire()
+        try:
+            self._data.clear()
+            self._root[:] = [self._root, self._root, None, None, 0]
+            self.bytes = 0
+            self.hits = self.misses = self.evictions = 0
+        finally:
+            self._lock.release()
+
+    def stats(self):
+        self._lock.acquire()
+        try:
+            lookups = self.hits + self.misses
+            return {
+                'entries':      len(self._data),
+                'bytes':        self.bytes,
+                'hits':         self.hits,
+                'misses':       self.misses,
+                'evictions':    self.evictions,
+                'hit_rate':     float(self.hits) / lookups if lookups else 0.0,
+            }
+        finally:
+            self._lock.release()
+
+    def _unlink(self, node):
+        node[PREV][NEXT] = node[NEXT]
+        node[NEXT][PREV] = node[PREV]
+        self.bytes -= node[SIZE]
+
+# The process wide result cache. None until enable_cache() is called.
+_result_cache = None
+
+def enable_cache(max_entries = DEFAULT_MAX_ENTRIES, max_bytes = DEFAULT_MAX_BYTES):
+    """
+    Turns on memoization of Extractor.extract_entities_with_indices, Validation.tweet_length
+    and Autolink.auto_link for the whole process. Calling it again replaces the cache.
+    """
+    global _result_cache
+    _result_cache = LRUCache(max_entries, max_bytes)
+    return _result_cache
+
+def disable_cache():
+    global _result_cache
+    _result_cache = None
+
+def cache_stats():
+    """
+    Returns the hit-rate statistics of the result cache or None if it is disabled.
+    """
+    cache = _result_cache
+    return cache.stats() if cache is not None else None
+
+def options_key(options):
+    """
+    Returns a hashable key for an options dict, or None if one of the values can't be part
+    of a key (callables or unhashable values), in which case the result must not be cached.
+    """
+    items = []
+    for key in sorted(options.keys()):
+        value = options[key]
+        if callable(value):
+            return None
+        try:
+            hash(value)
+        except TypeError:
+            return None
+        items.append((key, value))
+    return tuple(items)
+
+def cached(namespace, text, options, compute, copy = None):
+    """
+    Returns compute() memoized on namespace, text and the options dict when the result cache
+    is enabled. If copy is given, the cache keeps a private copy of the result and hands out
+    copies so callers can't modify each other's results.
+    """
+    cache = _result_cache
+    if cache is None:
+        return compute()
+    key = options_key(options)
+    if key is None:
+        return compute()
+    key = (namespace, text, key)
+    result = cache.get(key, _missing)
+    if result is _missing:
+        result = compute()
+        cache.set(key, copy(result) if copy else result)
+        return result
+    return copy(result) if copy else result
+
+_missing = object()
@@ -0,0 +1,128 @@
+# encoding=utf-8
+
+# Compiles the REGEXEN table with a different regular expression engine. The patterns are always
+# built and compiled with the stdlib re module first (regex.py composes them from each other's
+# source), then set_regex_engine() recompiles each one with the chosen engine and swaps it into
+# REGEXEN in place, so every Extractor, Autolink, Validation and HitHighlighter picks it up.
+#
+# Engines don't all support the same constructs, RE2 for example has no lookahead, which
+# valid_url needs for its TLDs. A pattern the engine can't compile keeps its stdlib version.
+# The re flags of each pattern are passed on as the engine's own flags of the same names, and
+# a pattern without re.UNICODE gets the engine's ASCII flag, since re then matches \w, \s, \d,
+# \b and letters of either case in ASCII only, where regex would match any Unicode text.
+import re, threading
+
+from twitter_text.regex import REGEXEN
+
+REGEX_ENGINES = ('re', 'regex', 're2')
+
+# the stdlib compiled patterns, as regex.py built them
+STDLIB_REGEXEN = dict([(key, value) for key, value in REGEXEN.iteritems() if hasattr(value, 'pattern')])
+
+# The re flags that change how a pattern matches
+FLAG_NAMES = ('IGNORECASE', 'LOCALE', 'MULTILINE', 'DOTALL', 'UNICODE', 'VERBOSE')
+
+# Flags an engine has no constant for because it always behaves as if they were set. RE2
+# always matches Unicode text, but its \w, \s, \d and \b only know ASCII, so a pattern using
+# them still needs re.
+IMPLIED_FLAGS = {
+    're2':  ('UNICODE',),
+}
+UNICODE_CLASSES = re.compile(r'(?<!\\)(?:\\\\)*\\[wWsSdDbB]')
+
+# The flags under which re matches Unicode rather than ASCII
+UNICODE_FLAGS = re.UNICODE | re.LOCALE
+
+_lock = threading.Lock()
+_engine = 're'
+_fallbacks = {}
+
+def _load_engine(name):
+    if name not in REGEX_ENGINES:
+        raise ValueError('Unknown regex engine %r, expected one of %s' % (name, ', '.join(REGEX_ENGINES)))
+    if name == 're':
+        return None
+    try:
+        return __import__(name)
+    except ImportError:
+        raise ImportError('The %s module is not installed.' % name)
+
+def available_regex_engines():
+    """
+    Returns the names of the engines that can be used in this environment.
+    """
+    available = []
+    for name in REGEX_ENGINES:
+        try:
+            _load_engine(name)
+        except ImportError:
+            continue
+        available.append(name)
+    return available
+
+def translate_flags(name, module, pattern, flags):
+    """
+    Returns the flags of the named engine (its module) equivalent to the re flags of pattern,
+    including its ASCII flag when pattern matches ASCII only in re. Raises ValueError if the
+    engine has no equivalent for one of them.
+    """
+    translated = 0
+    for flag in FLAG_NAMES:
+        if not flags & getattr(re, flag):
+            continue
+        if hasattr(module, flag):
+            translated |= getattr(module, flag)
+        elif flag in IMPLIED_FLAGS.get(name, ()) and not (flag == 'UNICODE' and UNICODE_CLASSES.search(pattern)):
+            continue
+        else:
+            raise ValueError('%s has no equivalent of re.%s for this pattern' % (name, flag))
+    if not flags & UNICODE_FLAGS:
+        if hasattr(module, 'ASCII'):
+            translated |= module.ASCII
+        elif flags & re.IGNORECASE:
+            # RE2's classes are ASCII only already, but it folds case for all of Unicode
+            raise ValueError('%s has no ASCII only case folding, which this pattern uses without re.UNICODE' % name)
+    return translated
+
+def set_regex_engine(name = 're'):
+    """
+    Recompiles every pattern in REGEXEN with the named engine: 're' (the default), 'regex' or
+    're2'. Patterns the engine rejects, or whose flags it has no equivalent for, keep using re.
+    Returns the keys of those patterns, see regex_engine_fallbacks for the reasons.
+    """
+    module = _load_engine(name)
+    compiled = {}
+    fallbacks = {}
+    for key, pattern in STDLIB_REGEXEN.iteritems():
+        if module is None:
+            compiled[key] = pattern
+            continue
+        try:
+            compiled[key] = module.compile(pattern.pattern, translate_flags(name, module, pattern.pattern, pattern.flags))
+        except Exception, e:
+            compiled[key] = pattern
+            fallbacks[key] = '%s: %s' % (e.__class__.__name__, e)
+
+    global _engine, _fallbacks
+    _lock.acquire()
+    try:
+        REGEXEN.update(compiled)
+        _engine = name
+        _fallbacks = fallbacks
+    finally:
+        _lock.release()
+    return sorted(fallbacks.keys())
+
+def regex_engine():
+    """
+    Returns the name of the engine REGEXEN is compiled with and the keys of the patterns that
+    fell back to re.
+    """
+    return _engine, sorted(_fallbacks.keys())
+
+def regex_engine_fallbacks():
+    """
+    Returns a dict from the key of every pattern that fell back to re to the reason, the error
+    the engine raised when compiling it.
+    """
+    return dict(_fallbacks)
@@ -1,16 +1,66 @@
 # encoding=utf-8
 
+import heapq
+
+from twitter_text.cache import cached, copy_entities
+from twitter_text.keys import entity_key
+from twitter_text.offsets import OffsetMap
 from twitter_text.regex import REGEXEN
+from twitter_text.scanner import UrlScanner, URL_ENGINES, URL_ENGINE_OPTIONS
 from twitter_text.unicode import force_unicode
+from twitter_text.urls import parse_url
 
 class Extractor(object):
     """
     A module for including Tweet parsing in a class. This module provides function for the extraction and processing
     of usernames, lists, URLs and hashtags.
     """
-    
-    def __init__(self, text):
-        self.text = force_unicode(text)
+
+    # The kinds of entities, in the order extract_entities_with_indices breaks ties between
+    # entities that start at the same index.
+    ENTITY_TYPES = ('urls', 'hashtags', 'mentions', 'cashtags')
+
+    # Characters that must appear in a text for each kind of entity to be possible. A URL always
+    # needs a dot before its TLD and cashtags are only looked for when there's an ASCII $.
+    TRIGGERS = {
+        'urls':     u'.',
+        'hashtags': u'#＃',
+        'mentions': u'@＠',
+        'cashtags': u'$',
+    }
+
+    def __init__(self, text, **kwargs):
+        self.analysis = kwargs.get('analysis')
+        self.text = self.analysis.text if self.analysis is not None else force_unicode(text)
+        self._offset_map = None
+
+    def _may_contain(self, kind):
+        if self.analysis is not None:
+            return self.analysis.may_contain(kind)
+        for char in self.TRIGGERS[kind]:
+            if char in self.text:
+                return True
+        return False
+
+    def _memoize(self, key, compute):
+        """
+        Shares results between the components of a TwitterText object through its analysis.
+        """
+        if self.analysis is None:
+            return compute()
+        return self.analysis.memoize(key, compute, copy_entities)
+
+    def convert_indices(self, entities, unit):
+        """
+        Returns copies of entities extracted from this text with their indices converted to
+        unit: 'python' (the default everywhere), 'utf16' or 'codepoint'. The offset map is built
+        once per Extractor and shared by every conversion.
+        """
+        if unit == 'python':
+            return entities
+        if self._offset_map is None:
+            self._offset_map = OffsetMap(self.text)
+        return self._offset_map.convert_entities(entities, unit)
 
     def _remove_overlapping_entities(self, entities):
         """
@@ -38,22 +88,110 @@ class Extractor(object):
         will be returned.
 
         If a transform is given then it will be called for each entity.
+
+        Indices are Python string indices unless options['index_unit'] asks for 'utf16' or 'codepoint'.
         """
         if not self.text:
             return []
 
+        without_protocol    =   bool(options.get('extract_url_without_protocol'))
+        extract_options     =   dict([(key, value) for key, value in options.items() if key != 'parse_urls'])
+        entities    =   self._memoize(('entities', without_protocol), lambda: cached('extract_entities_with_indices', self.text,
+                            {'extract_url_without_protocol': without_protocol},
+                            lambda: self._extract_entities_with_indices(extract_options), copy_entities))
+        if options.get('parse_urls'):
+            entities    =   self._with_parsed_urls(entities)
+        entities    =   self.convert_indices(entities, options.get('index_unit', 'python'))
+
+        return [transform(entity) for entity in entities]
+
+    def _extract_entities_with_indices(self, options = {}):
         # extract all entities
         entities    =   self.extract_urls_with_indices(options) + \
                         self.extract_hashtags_with_indices({'check_url_overlap': False}) + \
                         self.extract_mentions_or_lists_with_indices() + \
                         self.extract_cashtags_with_indices()
 
-        entities    =   self._remove_overlapping_entities(entities)
+        return self._remove_overlapping_entities(entities)
+
+    def iter_entities(self, types = ENTITY_TYPES, options = {}):
+        """
+        Yields the entities of the given types (see ENTITY_TYPES) in the order they appear in the
+        Tweet text, as they are found. These are the same entities extract_entities_with_indices
+        returns, with overlapping entities dropped the same way, but the text is only scanned as
+        far as the caller keeps asking for more, so stopping early skips the rest of the work.
 
+        If options['canonical_keys'] is true the hashtags, mentions and cashtags get a 'key' with
+        their interned canonical key (see twitter_text.keys).
+        """
+        if not self.text:
+            return
+
+        streams = []
+        for rank, kind in enumerate(self.ENTITY_TYPES):
+            if self._may_contain(kind):
+                streams.append(self._ranked_entities(rank, kind, options))
+
+        # URLs, ranked first, have no canonical key
+        canonical_keys = options.get('canonical_keys')
+        for rank, entity in self._skip_overlapping_entities(heapq.merge(*streams)):
+            if self.ENTITY_TYPES[rank] in types:
+                if canonical_keys and rank != 0:
+                    entity['key'] = entity_key(entity)
+                yield entity
+
+    def extract_entity_keys(self, types = ('hashtags', 'mentions', 'cashtags')):
+        """
+        Returns the interned canonical keys of the hashtags, mentions and cashtags in the Tweet
+        text, in the order they appear: u'#python' for #Python and ＃ＰＹＴＨＯＮ alike, u'@jack' or
+        u'$aapl'. Equal keys returned from the same intern table are the same object.
+        """
+        return [entity_key(entity) for entity in self.iter_entities(types)]
+
+    def _skip_overlapping_entities(self, ranked):
+        # the same overlap removal as _remove_overlapping_entities, one entity at a time, for
+        # (start, rank, entity) tuples in order of start
+        previous_end = None
+        for start, rank, entity in ranked:
+            if previous_end is not None and previous_end > start:
+                continue
+            previous_end = entity['indices'][1]
+            yield rank, entity
+
+    def _ranked_entities(self, rank, kind, options = {}):
+        if kind == 'urls':
+            entities = self._iter_urls(bool(options.get('extract_url_without_protocol')), options)
+        elif kind == 'hashtags':
+            entities = self._iter_hashtags()
+        elif kind == 'mentions':
+            entities = self._iter_mentions_or_lists()
+        else:
+            entities = self._iter_cashtags()
         for entity in entities:
-            entity  =   transform(entity)
+            yield entity['indices'][0], rank, entity
 
-        return entities
+    def has_urls(self, options = {}):
+        """
+        Returns True as soon as a URL is found in the Tweet text.
+        """
+        return self._has_entity('urls', options)
+
+    def has_hashtags(self):
+        return self._has_entity('hashtags')
+
+    def has_mentions(self):
+        """
+        Returns True as soon as a username or list mention is found in the Tweet text.
+        """
+        return self._has_entity('mentions')
+
+    def has_cashtags(self):
+        return self._has_entity('cashtags')
+
+    def _has_entity(self, kind, options = {}):
+        for entity in self.iter_entities((kind,), options):
+            return True
+        return False
 
     def extract_mentioned_screen_names(self, transform = lambda x: x):
         """
@@ -98,10 +236,18 @@ class Extractor(object):
         index, and the end index in the text. The list_slug will be an empty stirng
         if this is a username mention.
         """
-        if not REGEXEN['at_signs'].search(self.text):
+        if not self._may_contain('mentions'):
             return []
 
-        possible_entries    =   []
+        possible_entries = self._memoize('mentions_or_lists', self._extract_mentions_or_lists_with_indices)
+        for entry in possible_entries:
+            entry['screen_name'] = transform(entry['screen_name'])
+        return possible_entries
+
+    def _extract_mentions_or_lists_with_indices(self):
+        return list(self._iter_mentions_or_lists())
+
+    def _iter_mentions_or_lists(self):
         for match in REGEXEN['valid_mention_or_list'].finditer(self.text):
             try:
                 after = self.text[match.end()]
@@ -110,13 +256,11 @@ class Extractor(object):
                 after = None
             if after and REGEXEN['end_mention_match'].match(after) or match.groups()[2].find('http') == 0:
                 continue
-            possible_entries.append({
-                'screen_name':  transform(match.groups()[2]),
+            yield {
+                'screen_name':  match.groups()[2],
                 'list_slug':    match.groups()[3] or '',
                 'indices':      [match.start() + len(match.groups()[0]), match.end()]
-            })
-
-        return possible_entries
+            }
         
     def extract_reply_screen_name(self, transform = lambda x: x):
         """
@@ -153,45 +297,103 @@ class Extractor(object):
         URLs an empty list will be returned.
 
         If a block is given then it will be called for each URL.
+
+        URLs are found with REGEXEN['valid_url'] unless options['url_engine'] is 'linear', in which
+        case the same URLs are found by a scanner that takes linear time even on hostile input (see
+        twitter_text.scanner). options['url_max_steps'] and options['url_timeout'] (in seconds)
+        bound the work the scanner does for this call, ScanBudgetExceeded is raised when one runs out.
+
+        If options['parse_urls'] is true every URL also gets a 'parsed' dict with its scheme, host,
+        port, path, query, registrable domain and normalized form (see twitter_text.urls.parse_url).
         """
-        urls = []
-        for match in REGEXEN['valid_url'].finditer(self.text):
+        if not self._may_contain('urls'):
+            return []
+
+        without_protocol = bool(options.get('extract_url_without_protocol'))
+        urls = self._memoize(('urls', without_protocol), lambda: self._extract_urls_with_indices(without_protocol, options))
+        if options.get('parse_urls'):
+            return self._with_parsed_urls(urls)
+        return urls
+
+    def _with_parsed_urls(self, entities):
+        # the parsed records go on copies, the memoized and cached entities are shared between calls
+        result = []
+        for entity in entities:
+            if 'url' in entity:
+                entity = dict(entity)
+                entity['parsed'] = parse_url(entity['url'])
+            result.append(entity)
+        return result
+
+    def _extract_urls_with_indices(self, without_protocol, options = {}):
+        if self.analysis is None:
+            return list(self._iter_urls(without_protocol, options))
+        # Validation wants URLs without a protocol and Autolink doesn't, so the text is scanned
+        # once for both and each gets the URLs its option allows
+        engine = options.get('url_engine', 'regex')
+        candidates = self.analysis.memoize(('url_candidates', engine), lambda: list(self._iter_url_candidates(True, options)))
+        return [url for url, protocol in candidates if protocol or without_protocol]
+
+    def _url_matches(self, options):
+        """
+        Returns the matches of valid_url in the text and a function that finds valid_ascii_domain
+        matches in a domain, using the engine chosen by options['url_engine'].
+        """
+        engine = options.get('url_engine', 'regex')
+        if engine not in URL_ENGINES:
+            raise ValueError('Unknown URL engine %r, expected one of %s' % (engine, ', '.join(URL_ENGINES)))
+        if engine == 'linear':
+            scanner = UrlScanner(self.text, options.get('url_max_steps'), options.get('url_timeout'))
+            return scanner.finditer(), scanner.ascii_domain_finditer
+        return REGEXEN['valid_url'].finditer(self.text), REGEXEN['valid_ascii_domain'].finditer
+
+    def _iter_urls(self, without_protocol, options = {}):
+        for url, protocol in self._iter_url_candidates(without_protocol, options):
+            yield url
+
+    def _iter_url_candidates(self, without_protocol, options = {}):
+        """
+        Yields every URL found in the text with whether it had a protocol, the URLs without one
+        only if without_protocol is true.
+        """
+        matches, ascii_domains = self._url_matches(options)
+        for match in matches:
             complete, before, url, protocol, domain, port, path, query = match.groups()
             start_position = match.start() + len(before or '')
             end_position = match.end()
             # If protocol is missing and domain contains non-ASCII characters,
             # extract ASCII-only domains.
             if not protocol:
-                if not options.get('extract_url_without_protocol') or REGEXEN['invalid_url_without_protocol_preceding_chars'].search(before):
+                if not without_protocol or REGEXEN['invalid_url_without_protocol_preceding_chars'].search(before):
                     continue
                 last_url = None
                 last_url_invalid_match = None
-                for ascii_domain in REGEXEN['valid_ascii_domain'].finditer(domain):
+                for ascii_domain in ascii_domains(domain):
+                    # the last URL may still get the path appended, the others are final
+                    if last_url and not last_url_invalid_match:
+                        yield last_url, False
                     ascii_domain = ascii_domain.group()
                     last_url = {
                         'url':      ascii_domain,
                         'indices':  [start_position - len(before or '') + complete.find(ascii_domain), start_position - len(before or '') + complete.find(ascii_domain) + len(ascii_domain)]
                     }
                     last_url_invalid_match = REGEXEN['invalid_short_domain'].search(ascii_domain) is not None
-                    if not last_url_invalid_match:
-                        urls.append(last_url)
                 # no ASCII-only domain found. Skip the entire URL
                 if not last_url:
                     continue
                 if path:
                     last_url['url'] = url.replace(domain, last_url['url'])
                     last_url['indices'][1] = end_position
-                    if last_url_invalid_match:
-                        urls.append(last_url)
+                if path or not last_url_invalid_match:
+                    yield last_url, False
             else:
                 if REGEXEN['valid_tco_url'].match(url):
                     url = REGEXEN['valid_tco_url'].match(url).group()
                     end_position = start_position + len(url)
-                urls.append({
+                yield {
                     'url':      url,
                     'indices':  [start_position, end_position]
-                })
-        return urls
+                }, True
         
     def extract_hashtags(self, transform = lambda x: x):
         """
@@ -213,19 +415,21 @@ class Extractor(object):
 
         If a block is given then it will be called for each hashtag.
         """
-        tags = []
-        for match in REGEXEN['valid_hashtag'].finditer(self.text):
-            before, hashchar, hashtext = match.groups()
-            start_position, end_position = match.span()
-            start_position = start_position + len(before)
-            if not (REGEXEN['end_hashtag_match'].match(self.text[end_position]) if len(self.text) > end_position else None) and not hashtext.find('http') == 0 and not REGEXEN['numeric_only'].match(hashtext):
-                tags.append({
-                    'hashtag':  hashtext,
-                    'indices':  [start_position, end_position]
-                })
+        if not self._may_contain('hashtags'):
+            return []
+
+        check_url_overlap = bool(options.get('check_url_overlap'))
+        return self._memoize(('hashtags', check_url_overlap), lambda: self._extract_hashtags_with_indices(check_url_overlap, options))
 
-        if options.get('check_url_overlap'):
-            urls = self.extract_urls_with_indices()
+    def _extract_hashtags_with_indices(self, check_url_overlap, options = {}):
+        tags = list(self._iter_hashtags())
+
+        if check_url_overlap:
+            url_options = {'extract_url_without_protocol': True}
+            for key in URL_ENGINE_OPTIONS:
+                if key in options:
+                    url_options[key] = options[key]
+            urls = self.extract_urls_with_indices(url_options)
             if len(urls):
                 tags = tags + urls
                 # remove duplicates
@@ -234,6 +438,17 @@ class Extractor(object):
 
         return tags
 
+    def _iter_hashtags(self):
+        for match in REGEXEN['valid_hashtag'].finditer(self.text):
+            before, hashchar, hashtext = match.groups()
+            start_position, end_position = match.span()
+            start_position = start_position + len(before)
+            if not (REGEXEN['end_hashtag_match'].match(self.text[end_position]) if len(self.text) > end_position else None) and not hashtext.find('http') == 0 and not REGEXEN['numeric_only'].match(hashtext):
+                yield {
+                    'hashtag':  hashtext,
+                    'indices':  [start_position, end_position]
+                }
+
     def extract_cashtags(self, transform = lambda x: x):
         """
         Extracts a list of all cashtags included in the Tweet text. If the
@@ -254,17 +469,20 @@ class Extractor(object):
 
         If a block is given then it will be called for each cashtag.
         """
-        if not self.text or self.text.find('$') == -1:
+        if not self.text or not self._may_contain('cashtags'):
             return []
 
-        tags = []
+        return self._memoize('cashtags', self._extract_cashtags_with_indices)
+
+    def _extract_cashtags_with_indices(self):
+        return list(self._iter_cashtags())
+
+    def _iter_cashtags(self):
         for match in REGEXEN['valid_cashtag'].finditer(self.text):
             before, dollar, cashtext = match.groups()
             start_position, end_position = match.span()
             start_position = start_position + len(before or '')
-            tags.append({
+            yield {
                 'cashtag':  cashtext,
                 'indices':  [start_position, end_position]
-            })
-
-        return tags
\ No newline at end of file
+            }
\ No newline at end of file
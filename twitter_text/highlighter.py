@@ -25,7 +25,8 @@ def strip_tags(html):
 
 class HitHighlighter(object):
     def __init__(self, text, **kwargs):
-        self.text = force_unicode(text)
+        self.analysis = kwargs.get('analysis')
+        self.text = self.analysis.text if self.analysis is not None else force_unicode(text)
         self.parent = kwargs.get('parent', False)
 
     def hit_highlight(self, hits = [], **kwargs):
@@ -0,0 +1,345 @@
+# encoding=utf-8
+
+# An on-disk inverted index from entity keys (hashtags, mentions, cashtags and URL domains) to
+# the tweets they appear in.
+#
+# File layout, all fixed size fields little endian:
+#
+#   header      magic 'TTIX', format version, number of keys
+#   directory   one fixed size record per key, sorted by key: where the key's bytes are in
+#               the key blob, how long they are, and where its postings start and how many
+#               bytes they take
+#   keys        the UTF-8 encoded keys, back to back
+#   postings    two varints per posting: the tweet id as the difference from the previous
+#               posting of the same key (postings are sorted by tweet id) and the start index
+#               of the entity in the tweet. A varint holds 7 bits of the number per byte, low
+#               bits first, with the high bit set on every byte but the last, so the small
+#               deltas and start indices of a busy key take a byte or two each.
+#
+# The reader maps the file and binary searches the directory, so only the postings of the keys
+# that are looked up are ever read into memory.
+import heapq, mmap, os, shutil, struct, tempfile
+
+from twitter_text.extractor import Extractor
+from twitter_text.keys import fold_entity
+
+MAGIC = 'TTIX'
+# 2: hashtags, mentions and cashtags are keyed NFKC normalized and case folded
+# 3: postings are varints rather than an array of the platform's unsigned longs
+VERSION = 3
+HEADER = struct.Struct('<4sB3xI')
+DIRECTORY_ENTRY = struct.Struct('<IIQI')
+# the largest key offset, key length and postings length the directory can hold
+MAX_FIELD = 0xffffffff
+
+INDEX_KINDS = ('hashtags', 'mentions', 'cashtags', 'domains')
+
+DEFAULT_SHARD_SIZE = 100000
+
+def entity_key(kind, value):
+    """
+    The normalized key for an entity value of the given kind (one of INDEX_KINDS). Domains are
+    lowercased, the other values folded like canonical entity keys (see twitter_text.keys).
+    """
+    if kind == 'domains':
+        return u'%s:%s' % (kind, value.lower())
+    return u'%s:%s' % (kind, fold_entity(value))
+
+def url_domain(url):
+    """
+    The host part of a URL as extracted from a Tweet, which may or may not have a protocol.
+    """
+    start = url.find(u'://')
+    host = url[start + 3:] if start != -1 else url
+    for separator in u'/?#:':
+        end = host.find(separator)
+        if end != -1:
+            host = host[:end]
+    return host
+
+def encode_varint(value, buf):
+    """
+    Appends the varint encoding of a non-negative integer to a bytearray.
+    """
+    while value > 0x7f:
+        buf.append(value & 0x7f | 0x80)
+        value >>= 7
+    buf.append(value)
+
+def decode_varints(data):
+    """
+    Returns the list of non-negative integers varint encoded in a string of bytes.
+    """
+    values = []
+    value = shift = 0
+    for byte in bytearray(data):
+        value |= (byte & 0x7f) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            values.append(value)
+            value = shift = 0
+    return values
+
+def entity_keys(text):
+    """
+    Returns a list of (key, start index) pairs for the indexable entities in text.
+    """
+    keys = []
+    for entity in Extractor(text).iter_entities(options = {'extract_url_without_protocol': True}):
+        if 'hashtag' in entity:
+            key = entity_key('hashtags', entity['hashtag'])
+        elif 'cashtag' in entity:
+            key = entity_key('cashtags', entity['cashtag'])
+        elif 'screen_name' in entity:
+            key = entity_key('mentions', entity['screen_name'])
+        else:
+            key = entity_key('domains', url_domain(entity['url']))
+        keys.append((key, entity['indices'][0]))
+    return keys
+
+class IndexBuilder(object):
+    """
+    Collects the postings of a stream of (tweet id, text) pairs in memory and writes them out as
+    an index file. Tweet ids must be non-negative integers.
+    """
+
+    def __init__(self):
+        self.postings = {}
+
+    def add(self, tweet_id, text):
+        for key, start in entity_keys(text):
+            self.postings.setdefault(key, []).append((tweet_id, start))
+
+    def add_many(self, pairs):
+        for tweet_id, text in pairs:
+            self.add(tweet_id, text)
+
+    def write(self, path):
+        items = []
+        for key in sorted(self.postings.keys(), key = lambda key: key.encode('utf-8')):
+            items.append((key, sorted(self.postings[key])))
+        write_index(path, items)
+
+def write_index(path, items):
+    """
+    Writes an index file from an iterable of (key, postings) pairs sorted by the UTF-8 encoding
+    of the keys, each postings list being sorted (tweet id, start index) pairs. Raises
+    ValueError if the keys or the postings of a key take more than MAX_FIELD bytes.
+    """
+    directory = []
+    key_blob = []
+    key_offset = 0
+    postings_offset = 0
+    postings_file = tempfile.TemporaryFile()
+    try:
+        for key, postings in items:
+            encoded = key.encode('utf-8')
+            buf = bytearray()
+            previous_id = 0
+            for tweet_id, start in postings:
+                encode_varint(tweet_id - previous_id, buf)
+                encode_varint(start, buf)
+                previous_id = tweet_id
+            if key_offset + len(encoded) > MAX_FIELD:
+                raise ValueError('The keys take more than %d bytes' % MAX_FIELD)
+            if len(buf) > MAX_FIELD:
+                raise ValueError('The postings of %r take more than %d bytes' % (key, MAX_FIELD))
+            postings_file.write(buf)
+            directory.append(DIRECTORY_ENTRY.pack(key_offset, len(encoded), postings_offset, len(buf)))
+            key_blob.append(encoded)
+            key_offset += len(encoded)
+            postings_offset += len(buf)
+
+        output = open(path, 'wb')
+        try:
+            output.write(HEADER.pack(MAGIC, VERSION, len(directory)))
+            output.write(''.join(directory))
+            output.write(''.join(key_blob))
+            postings_file.seek(0)
+            shutil.copyfileobj(postings_file, output)
+        finally:
+            output.close()
+    finally:
+        postings_file.close()
+
+class IndexReader(object):
+    """
+    Looks up postings in an index file through a read-only memory map.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access = mmap.ACCESS_READ)
+        except Exception:
+            self._file.close()
+            raise
+        magic, version, self.key_count = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError('%s is not a twitter_text index' % path)
+        self._directory_start = HEADER.size
+        self._keys_start = self._directory_start + self.key_count * DIRECTORY_ENTRY.size
+        key_bytes = 0
+        if self.key_count:
+            key_offset, key_length = self._entry(self.key_count - 1)[:2]
+            key_bytes = key_offset + key_length
+        self._postings_start = self._keys_start + key_bytes
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return self.key_count
+
+    def __contains__(self, key):
+        return self._find(key) is not None
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+    def _entry(self, position):
+        return DIRECTORY_ENTRY.unpack_from(self._map, self._directory_start + position * DIRECTORY_ENTRY.size)
+
+    def _key(self, entry):
+        start = self._keys_start + entry[0]
+        return self._map[start:start + entry[1]]
+
+    def _find(self, key):
+        encoded = key.encode('utf-8')
+        low, high = 0, self.key_count
+        while low < high:
+            middle = (low + high) // 2
+            entry = self._entry(middle)
+            found = self._key(entry)
+            if found < encoded:
+                low = middle + 1
+            elif found > encoded:
+                high = middle
+            else:
+                return entry
+        return None
+
+    def _decode(self, entry):
+        start = self._postings_start + entry[2]
+        values = decode_varints(self._map[start:start + entry[3]])
+        postings = []
+        tweet_id = 0
+        for position in xrange(0, len(values), 2):
+            tweet_id += values[position]
+            postings.append((tweet_id, values[position + 1]))
+        return postings
+
+    def keys(self):
+        """
+        Yields every key in the index in sorted order.
+        """
+        for position in xrange(self.key_count):
+            yield self._key(self._entry(position)).decode('utf-8')
+
+    def items(self):
+        """
+        Yields every (key, postings) pair in the index in sorted order.
+        """
+        for position in xrange(self.key_count):
+            entry = self._entry(position)
+            yield self._key(entry).decode('utf-8'), self._decode(entry)
+
+    def postings(self, kind, value):
+        """
+        Returns the sorted (tweet id, start index) pairs of the entity value of the given kind,
+        for example postings('hashtags', u'python').
+        """
+        return self.get(entity_key(kind, value))
+
+    def tweet_ids(self, kind, value):
+        ids = []
+        for tweet_id, start in self.postings(kind, value):
+            if not ids or ids[-1] != tweet_id:
+                ids.append(tweet_id)
+        return ids
+
+    def get(self, key):
+        entry = self._find(key)
+        if entry is None:
+            return []
+        return self._decode(entry)
+
+def merge_indexes(paths, path):
+    """
+    Merges the index files at paths into a single index file at path.
+    """
+    readers = [IndexReader(shard) for shard in paths]
+    try:
+        write_index(path, _merged_items(readers))
+    finally:
+        for reader in readers:
+            reader.close()
+
+def _merged_items(readers):
+    streams = []
+    for number, reader in enumerate(readers):
+        streams.append(((key.encode('utf-8'), number, key, postings) for key, postings in reader.items()))
+    current = None
+    merged = []
+    for encoded, number, key, postings in heapq.merge(*streams):
+        if key != current:
+            if current is not None:
+                yield current, sorted(merged)
+            current, merged = key, []
+        merged.extend(postings)
+    if current is not None:
+        yield current, sorted(merged)
+
+def _build_shard(args):
+    path, pairs = args
+    builder = IndexBuilder()
+    builder.add_many(pairs)
+    builder.write(path)
+    return path
+
+def _shards(pairs, shard_size, directory):
+    shard = []
+    number = 0
+    for pair in pairs:
+        shard.append(pair)
+        if len(shard) >= shard_size:
+            yield os.path.join(directory, 'shard-%d' % number), shard
+            shard = []
+            number += 1
+    if shard:
+        yield os.path.join(directory, 'shard-%d' % number), shard
+
+def build_index(pairs, path, processes = 1, shard_size = DEFAULT_SHARD_SIZE):
+    """
+    Builds an index file at path from an iterable of (tweet id, text) pairs. The pairs are split
+    into shards of shard_size tweets, which are indexed by a pool of processes worker processes
+    (or in this process if processes is 1) and merged at the end.
+    """
+    directory = tempfile.mkdtemp()
+    try:
+        if processes == 1:
+            shard_paths = [_build_shard(shard) for shard in _shards(pairs, shard_size, directory)]
+        else:
+            import multiprocessing
+            pool = multiprocessing.Pool(processes)
+            try:
+                shard_paths = list(pool.imap(_build_shard, _shards(pairs, shard_size, directory)))
+            finally:
+                pool.close()
+                pool.join()
+        if len(shard_paths) == 1:
+            shutil.move(shard_paths[0], path)
+        else:
+            merge_indexes(shard_paths, path)
+    finally:
+        shutil.rmtree(directory, ignore_errors = True)
+    return path
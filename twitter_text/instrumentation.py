@@ -0,0 +1,251 @@
+# encoding=utf-8
+
+# Opt-in timing counters for the library's hot paths.
+#
+# Nothing is measured until enable() is called: it replaces the methods of each stage and the
+# patterns in REGEXEN with timed wrappers, and disable() puts the originals back, so code that
+# never enables instrumentation runs exactly the code it would without this module.
+#
+# Every stage and pattern gets a counter of calls, total seconds, total input size (characters
+# of text, or entities for overlap removal) and entities or matches produced. snapshot()
+# returns a copy of all of them; hooks added with add_hook() are called after every measurement
+# and can forward them to StatsD, Prometheus and the like.
+import threading
+from timeit import default_timer
+
+from twitter_text.autolink import Autolink
+from twitter_text.extractor import Extractor
+from twitter_text.highlighter import HitHighlighter
+from twitter_text.regex import REGEXEN
+from twitter_text.validation import Validation
+
+# (class, method, stage name, kind of method)
+STAGES = (
+    (Extractor,         '_iter_url_candidates',         'extract.urls',             'generator'),
+    (Extractor,         '_iter_hashtags',               'extract.hashtags',         'generator'),
+    (Extractor,         '_iter_mentions_or_lists',      'extract.mentions',         'generator'),
+    (Extractor,         '_iter_cashtags',               'extract.cashtags',         'generator'),
+    (Extractor,         '_remove_overlapping_entities', 'extract.remove_overlaps',  'overlaps'),
+    (Extractor,         '_skip_overlapping_entities',   'extract.remove_overlaps',  'filter'),
+    (Validation,        '_collective_weight',           'validation.weighting',     'text'),
+    (Autolink,          'auto_link_entities',           'autolink.render',          'entities'),
+    (HitHighlighter,    'hit_highlight',                'highlight.render',         'text'),
+)
+
+REGEX_METHODS = ('match', 'search', 'finditer', 'findall', 'sub', 'subn', 'split')
+
+_lock = threading.Lock()
+_counters = {}
+_hooks = []
+# the original methods and patterns while enabled, None otherwise
+_originals = None
+
+def record(name, seconds, size = 0, entities = 0):
+    """
+    Adds one measurement to the counter called name and passes it on to the hooks.
+    """
+    _lock.acquire()
+    try:
+        counter = _counters.get(name)
+        if counter is None:
+            counter = _counters[name] = {'calls': 0, 'seconds': 0.0, 'input_size': 0, 'entities': 0}
+        counter['calls'] += 1
+        counter['seconds'] += seconds
+        counter['input_size'] += size
+        counter['entities'] += entities
+        hooks = list(_hooks)
+    finally:
+        _lock.release()
+    for hook in hooks:
+        hook(name, seconds, size, entities)
+
+def snapshot():
+    """
+    Returns a copy of every counter: {name: {'calls', 'seconds', 'input_size', 'entities'}}.
+    """
+    _lock.acquire()
+    try:
+        return dict([(name, dict(counter)) for name, counter in _counters.iteritems()])
+    finally:
+        _lock.release()
+
+def reset():
+    _lock.acquire()
+    try:
+        _counters.clear()
+    finally:
+        _lock.release()
+
+def add_hook(hook):
+    """
+    Calls hook(name, seconds, input_size, entities) after every measurement, on the thread that
+    made it.
+    """
+    _lock.acquire()
+    try:
+        _hooks.append(hook)
+    finally:
+        _lock.release()
+
+def remove_hook(hook):
+    _lock.acquire()
+    try:
+        _hooks.remove(hook)
+    finally:
+        _lock.release()
+
+def enabled():
+    return _originals is not None
+
+def enable():
+    global _originals
+    _lock.acquire()
+    try:
+        if _originals is not None:
+            return
+        methods = []
+        for cls, method, name, kind in STAGES:
+            original = cls.__dict__[method]
+            methods.append((cls, method, original))
+            setattr(cls, method, _timed_method(original, name, kind))
+        for key, pattern in REGEXEN.items():
+            if hasattr(pattern, 'pattern'):
+                REGEXEN[key] = TimedPattern(pattern, 'regex.%s' % key)
+        _originals = methods
+    finally:
+        _lock.release()
+
+def disable():
+    global _originals
+    _lock.acquire()
+    try:
+        if _originals is None:
+            return
+        for cls, method, original in _originals:
+            setattr(cls, method, original)
+        for key, pattern in REGEXEN.items():
+            # patterns replaced since, e.g. by set_regex_engine, are left alone
+            if isinstance(pattern, TimedPattern):
+                REGEXEN[key] = pattern.wrapped
+        _originals = None
+    finally:
+        _lock.release()
+
+def _timed_iterator(iterator, name, size):
+    seconds = 0.0
+    count = 0
+    try:
+        while True:
+            started = default_timer()
+            try:
+                item = iterator.next()
+            except StopIteration:
+                seconds += default_timer() - started
+                break
+            seconds += default_timer() - started
+            count += 1
+            yield item
+    finally:
+        record(name, seconds, size, count)
+
+def _timed_filter(items, filtered, name):
+    # times a generator filtering items, less the time spent pulling the items from the stages
+    # before it, and counts the items it took in as well as the ones it let through
+    upstream = [0.0, 0]
+    def pull():
+        iterator = iter(items)
+        while True:
+            started = default_timer()
+            try:
+                item = iterator.next()
+            except StopIteration:
+                upstream[0] += default_timer() - started
+                return
+            upstream[0] += default_timer() - started
+            upstream[1] += 1
+            yield item
+    iterator = filtered(pull())
+    seconds = 0.0
+    count = 0
+    try:
+        while True:
+            started = default_timer()
+            try:
+                item = iterator.next()
+            except StopIteration:
+                seconds += default_timer() - started
+                break
+            seconds += default_timer() - started
+            count += 1
+            yield item
+    finally:
+        record(name, seconds - upstream[0], upstream[1], count)
+
+def _timed_method(function, name, kind):
+    if kind == 'generator':
+        def timed(self, *args, **kwargs):
+            return _timed_iterator(function(self, *args, **kwargs), name, len(self.text))
+    elif kind == 'overlaps':
+        def timed(self, entities):
+            # the entities are removed from the list in place, so they are counted before
+            size = len(entities)
+            started = default_timer()
+            result = function(self, entities)
+            record(name, default_timer() - started, size, len(result))
+            return result
+    elif kind == 'filter':
+        def timed(self, items):
+            return _timed_filter(items, lambda pulled: function(self, pulled), name)
+    elif kind == 'entities':
+        def timed(self, entities = [], *args, **kwargs):
+            started = default_timer()
+            result = function(self, entities, *args, **kwargs)
+            record(name, default_timer() - started, len(self.text), len(entities))
+            return result
+    else:
+        def timed(self, *args, **kwargs):
+            started = default_timer()
+            result = function(self, *args, **kwargs)
+            record(name, default_timer() - started, len(self.text))
+            return result
+    timed.__name__ = function.__name__
+    timed.__doc__ = function.__doc__
+    return timed
+
+class TimedPattern(object):
+    """
+    Stands in for a compiled pattern in REGEXEN while instrumentation is enabled and times every
+    match, search, finditer, findall, sub, subn and split call on it.
+    """
+
+    def __init__(self, wrapped, name):
+        self.wrapped = wrapped
+        self.name = name
+        for method in REGEX_METHODS:
+            setattr(self, method, self._timed(method))
+
+    def __getattr__(self, attribute):
+        # pattern, flags, groups, groupindex
+        return getattr(self.wrapped, attribute)
+
+    def _timed(self, method):
+        function = getattr(self.wrapped, method)
+        name = self.name
+        if method == 'finditer':
+            def timed(string, *args, **kwargs):
+                return _timed_iterator(function(string, *args, **kwargs), name, len(string))
+        else:
+            def timed(*args, **kwargs):
+                started = default_timer()
+                result = function(*args, **kwargs)
+                # sub and subn take the replacement first
+                string = args[1] if method in ('sub', 'subn') and len(args) > 1 else (args[0] if args else '')
+                if method in ('match', 'search'):
+                    found = int(result is not None)
+                elif method == 'findall':
+                    found = len(result)
+                else:
+                    found = 0
+                record(name, default_timer() - started, len(string), found)
+                return result
+        return timed
@@ -0,0 +1,118 @@
+# encoding=utf-8
+
+# Canonical keys for hashtags, mentions and cashtags. Variants of the same entity (#Python,
+# #python, ＃ＰＹＴＨＯＮ) get the same key, and the keys are interned so that code grouping
+# millions of entities keeps one string object per distinct key and can compare them by identity.
+import threading, unicodedata
+
+KEY_SYMBOLS = {
+    'hashtags': u'#',
+    'mentions': u'@',
+    'cashtags': u'$',
+}
+
+# The full case folds that lower() doesn't do, for characters that are left after NFKC
+CASE_FOLDS = {
+    0xdf:   u'ss',
+    0x3c2:  u'σ',
+    0x345:  u'ι',
+}
+_FOLDED = frozenset([unichr(codepoint) for codepoint in CASE_FOLDS])
+
+INTERN_TABLE_SIZE = 100000
+
+def fold_entity(value):
+    """
+    Returns value NFKC normalized and case folded, so that full width and compatibility forms
+    and differences of case all fold to the same string.
+    """
+    value = unicodedata.normalize('NFKC', value).lower()
+    for char in _FOLDED:
+        if char in value:
+            return unicodedata.normalize('NFKC', value.translate(CASE_FOLDS))
+    return value
+
+class InternTable(object):
+    """
+    A bounded table of canonical keys. Every value is looked up together with its kind, so an
+    entity that was seen before costs one dict lookup and returns the key object already in the
+    table. Once the table holds more than max_entries values it starts over: keys handed out
+    before still compare equal to the new ones, they just aren't the same objects any more.
+    """
+
+    def __init__(self, max_entries = INTERN_TABLE_SIZE):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._keys = {}
+        self.hits = 0
+        self.misses = 0
+        self.resets = 0
+
+    def __len__(self):
+        return len(self._keys)
+
+    def key(self, kind, value):
+        """
+        Returns the canonical key for an entity value of the given kind ('hashtags', 'mentions' or
+        'cashtags'): the ASCII symbol of the kind followed by the folded value, such as u'#python'.
+        """
+        key = self._keys.get((kind, value))
+        if key is not None:
+            self.hits += 1
+            return key
+        self.misses += 1
+        key = KEY_SYMBOLS[kind] + fold_entity(value)
+        self._lock.acquire()
+        try:
+            if len(self._keys) >= self.max_entries:
+                self._keys = {}
+                self.resets += 1
+            # the key is stored under itself too, so different spellings share one object
+            key = self._keys.setdefault(key, key)
+            self._keys[(kind, value)] = key
+        finally:
+            self._lock.release()
+        return key
+
+    def clear(self):
+        self._lock.acquire()
+        try:
+            self._keys = {}
+            self.hits = self.misses = self.resets = 0
+        finally:
+            self._lock.release()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'entries':      len(self._keys),
+            'hits':         self.hits,
+            'misses':       self.misses,
+            'resets':       self.resets,
+            'hit_rate':     float(self.hits) / lookups if lookups else 0.0,
+        }
+
+# The process wide table canonical_key uses
+_intern_table = InternTable()
+
+def canonical_key(kind, value):
+    """
+    Returns the interned canonical key for an entity value of the given kind. See InternTable.key.
+    """
+    return _intern_table.key(kind, value)
+
+def entity_key(entity):
+    """
+    Returns the canonical key for a hashtag, mention or cashtag entity as returned by the Extractor.
+    """
+    if 'hashtag' in entity:
+        return _intern_table.key('hashtags', entity['hashtag'])
+    if 'cashtag' in entity:
+        return _intern_table.key('cashtags', entity['cashtag'])
+    return _intern_table.key('mentions', entity['screen_name'])
+
+def intern_table_stats():
+    return _intern_table.stats()
+
+def clear_intern_table():
+    _intern_table.clear()
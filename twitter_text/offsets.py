@@ -0,0 +1,109 @@
+# encoding=utf-8
+
+import re, sys
+from bisect import bisect_left, bisect_right
+
+# Python string indices count UTF-16 code units on narrow builds and code points on wide ones.
+NARROW_BUILD = sys.maxunicode == 0xffff
+
+if NARROW_BUILD:
+    # surrogate pairs, each one is a single code point
+    ASTRAL_CHARACTER = re.compile(u'[\ud800-\udbff][\udc00-\udfff]')
+else:
+    ASTRAL_CHARACTER = re.compile(u'[\U00010000-\U0010ffff]')
+
+INDEX_UNITS = ('python', 'utf16', 'codepoint')
+
+# Every byte value that isn't a UTF-8 continuation byte (0b10xxxxxx). Deleting them from a
+# chunk of UTF-8 leaves one byte for each continuation byte it contains.
+NON_CONTINUATION_BYTES = ''.join([chr(byte) for byte in range(0x80) + range(0xc0, 0x100)])
+
+def byte_offsets(text, indices):
+    """
+    Maps indices into the unicode string text to offsets into its UTF-8 encoding. Only the
+    spans between consecutive indices are encoded, so the text is visited once however many
+    indices are asked for. Returns a dict of index to byte offset.
+    """
+    offsets = {}
+    position = byte_position = 0
+    for index in sorted(set(indices)):
+        byte_position += len(text[position:index].encode('utf-8'))
+        position = index
+        offsets[index] = byte_position
+    return offsets
+
+def codepoint_offsets(buf, offsets):
+    """
+    Maps byte offsets into the UTF-8 buffer buf (a str or a memoryview of one) to code point
+    offsets without decoding it, by discounting the continuation bytes between consecutive
+    offsets. Returns a dict of byte offset to code point offset.
+    """
+    result = {}
+    position = codepoint = 0
+    for offset in sorted(set(offsets)):
+        chunk = buf[position:offset]
+        if not isinstance(chunk, str):
+            chunk = chunk.tobytes()
+        codepoint += len(chunk) - len(chunk.translate(None, NON_CONTINUATION_BYTES))
+        position = offset
+        result[offset] = codepoint
+    return result
+
+class OffsetMap(object):
+    """
+    Converts Python string indices into text to UTF-16 code unit offsets (as used by JavaScript
+    and the Twitter API) or code point offsets, whichever the Python build doesn't already use.
+    The map is built with a single pass over the text that records where the characters outside
+    the Basic Multilingual Plane are, and each conversion is then a binary search of that list.
+    """
+
+    def __init__(self, text):
+        self.text = text
+        self.astral = [match.start() for match in ASTRAL_CHARACTER.finditer(text)]
+
+    def convert(self, index, unit):
+        if unit not in INDEX_UNITS:
+            raise ValueError('Unknown index unit %r, expected one of %s' % (unit, ', '.join(INDEX_UNITS)))
+        if unit == 'python' or not self.astral:
+            return index
+        if NARROW_BUILD:
+            if unit == 'utf16':
+                return index
+            # every surrogate pair that ends before index counts as one code point
+            return index - bisect_right(self.astral, index - 2)
+        if unit == 'codepoint':
+            return index
+        # every astral character before index takes two UTF-16 code units
+        return index + bisect_left(self.astral, index)
+
+    def to_python(self, index, unit):
+        """
+        The inverse of convert: maps an index in unit, such as one from the Twitter API, back to
+        a Python string index into the text.
+        """
+        if unit not in INDEX_UNITS:
+            raise ValueError('Unknown index unit %r, expected one of %s' % (unit, ', '.join(INDEX_UNITS)))
+        if unit == 'python' or not self.astral:
+            return index
+        if NARROW_BUILD:
+            if unit == 'utf16':
+                return index
+            # the k-th surrogate pair starts at code point astral[k] - k
+            starts = [position - k for k, position in enumerate(self.astral)]
+            return index + bisect_left(starts, index)
+        if unit == 'codepoint':
+            return index
+        # the k-th astral character starts at UTF-16 offset astral[k] + k and ends two units later
+        ends = [position + k + 2 for k, position in enumerate(self.astral)]
+        return index - bisect_right(ends, index)
+
+    def convert_entities(self, entities, unit):
+        """
+        Returns copies of entities with their indices converted to unit.
+        """
+        converted = []
+        for entity in entities:
+            entity = dict(entity)
+            entity['indices'] = [self.convert(entity['indices'][0], unit), self.convert(entity['indices'][1], unit)]
+            converted.append(entity)
+        return converted
@@ -174,6 +174,11 @@ REGEXEN['valid_reply'] = re.compile(ur'^(?:[%s])*%s([a-zA-Z0-9_]{1,20})' % (REGE
  # Used in Extractor for final filtering
 REGEXEN['end_mention_match'] = re.compile(ur'\A(?:%s|[%s]|:\/\/)' % (REGEXEN['at_signs'].pattern, REGEXEN['latin_accents'].pattern), re.IGNORECASE | re.UNICODE)
 
+# Anchored versions used by Validation to check a single token without extracting
+REGEXEN['valid_username'] = re.compile(ur'\A%s([a-zA-Z0-9_]{1,20})\Z' % REGEXEN['at_signs'].pattern)
+REGEXEN['valid_list'] = re.compile(ur'^%s$' % REGEXEN['valid_mention_or_list'].pattern)
+REGEXEN['valid_hashtag_token'] = re.compile(ur'\A(?:#|＃)(%s*%s%s*)\Z' % (HASHTAG_ALPHANUMERIC, HASHTAG_ALPHA, HASHTAG_ALPHANUMERIC), re.IGNORECASE)
+
 # URL related hash regex collection
 REGEXEN['valid_url_preceding_chars'] = re.compile(ur'(?:[^A-Z0-9@＠$#＃%s]|^)' % ur''.join(REGEXEN['invalid_control_characters']), re.IGNORECASE | re.UNICODE)
 REGEXEN['invalid_url_without_protocol_preceding_chars'] = re.compile(ur'[-_.\/]$')
@@ -276,5 +281,6 @@ REGEXEN['validate_url_fragment'] = re.compile(ur'(%s|/|\?)*' % REGEXEN['validate
 
 # Modified version of RFC 3986 Appendix B
 REGEXEN['validate_url_unencoded'] = re.compile(ur'\A(?:([^:/?#]+)://)?([^/?#]*)([^?#]*)(?:\?([^#]*))?(?:\#(.*))?\Z', re.IGNORECASE | re.UNICODE)
+REGEXEN['validate_url_http_scheme'] = re.compile(ur'^https?$', re.IGNORECASE)
 
 REGEXEN['rtl_chars'] = re.compile(ur'[%s]' % RTL_CHARACTERS, re.IGNORECASE | re.UNICODE)
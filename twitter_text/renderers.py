@@ -0,0 +1,210 @@
+# encoding=utf-8
+
+# Renders a Tweet in several formats from one extraction. The entities are extracted and their
+# overlaps resolved once, the text is cut into a list of segments, and every renderer walks the
+# same list, so each additional format only costs its own formatting.
+import re
+
+from twitter_text.autolink import Autolink, DEFAULT_OPTIONS
+from twitter_text.extractor import Extractor
+from twitter_text.offsets import OffsetMap
+from twitter_text.unicode import force_unicode
+
+# Options for the renderers that Autolink would otherwise turn into HTML attributes
+RENDER_OPTIONS = (
+    'index_unit',
+    'ansi_styles',
+)
+
+# Select Graphic Rendition parameters for each kind of entity
+DEFAULT_ANSI_STYLES = {
+    'url':      '4;34',
+    'hashtag':  '36',
+    'mention':  '35',
+    'cashtag':  '33',
+}
+
+MARKDOWN_SPECIAL = re.compile(ur'([\\`*_\[\]<>~|])')
+
+def segments(text, entities):
+    """
+    Cuts text into a list of (entity, start, end) segments covering all of it in order, entity
+    being None for the text between entities. Entities that overlap an earlier one are skipped.
+    """
+    result = []
+    position = 0
+    for entity in sorted(entities, key = lambda entity: entity['indices'][0]):
+        start, end = entity['indices']
+        if start < position:
+            continue
+        if start > position:
+            result.append((None, position, start))
+        result.append((entity, start, end))
+        position = end
+    if position < len(text):
+        result.append((None, position, len(text)))
+    return result
+
+def entity_type(entity):
+    """
+    Returns 'url', 'hashtag', 'mention' (for usernames and lists) or 'cashtag'.
+    """
+    if 'url' in entity:
+        return 'url'
+    if 'hashtag' in entity:
+        return 'hashtag'
+    if 'screen_name' in entity:
+        return 'mention'
+    return 'cashtag'
+
+class Renderer(object):
+    """
+    Renders the segments of a text in one format. Subclasses set name, which render() returns
+    their output under, and override text() for the text between entities and entity() for the
+    entities, or render() itself to build something other than a string. The options are the
+    ones Autolink takes, the URL bases and transforms in particular.
+    """
+
+    name = 'text'
+
+    def __init__(self, options = {}):
+        self.options = dict(DEFAULT_OPTIONS.items() + options.items())
+
+    def render(self, text, segments):
+        parts = []
+        for entity, start, end in segments:
+            chunk = text[start:end]
+            parts.append(self.text(chunk) if entity is None else self.entity(entity, chunk))
+        return u''.join(parts)
+
+    def text(self, chunk):
+        return chunk
+
+    def entity(self, entity, chunk):
+        return self.text(chunk)
+
+    def href(self, entity):
+        """
+        Returns where an entity links to, the same href Autolink gives it.
+        """
+        options = self.options
+        if 'url' in entity:
+            kind, value = 'link', entity['url']
+        elif 'hashtag' in entity:
+            kind, value = 'hashtag', entity['hashtag']
+        elif 'screen_name' in entity:
+            value = (u'%s%s' % (entity['screen_name'], entity.get('list_slug') or '')).lower()
+            kind = 'list' if entity.get('list_slug') and not options.get('supress_lists') else 'username'
+        else:
+            kind, value = 'cashtag', entity['cashtag']
+        transform = options.get(kind + '_url_transform')
+        if transform is not None:
+            return transform(value)
+        return value if kind == 'link' else u'%s%s' % (options.get(kind + '_url_base'), value)
+
+class HtmlRenderer(Renderer):
+    """
+    The HTML of Autolink.auto_link with the same options, links cached the same way.
+    """
+
+    name = 'html'
+
+    def __init__(self, options = {}):
+        self.options = dict([(key, value) for key, value in options.items() if not key in RENDER_OPTIONS])
+
+    def render(self, text, segments):
+        autolink = Autolink(text)
+        options = autolink._prepare_options(self.options)
+        parts = []
+        for entity, start, end in segments:
+            parts.append(text[start:end] if entity is None else autolink._entity_link(entity, text[start], options))
+        return u''.join(parts)
+
+class MarkdownRenderer(Renderer):
+    """
+    Markdown with the entities as inline links and the Markdown syntax characters in the text
+    escaped.
+    """
+
+    name = 'markdown'
+
+    def text(self, chunk):
+        # most chunks have nothing to escape, and looking is cheaper than substituting
+        if MARKDOWN_SPECIAL.search(chunk) is None:
+            return chunk
+        return MARKDOWN_SPECIAL.sub(ur'\\\1', chunk)
+
+    def entity(self, entity, chunk):
+        href = self.href(entity).replace(u' ', u'%20').replace(u'(', u'%28').replace(u')', u'%29')
+        return u'[%s](%s)' % (self.text(chunk), href)
+
+class AnsiRenderer(Renderer):
+    """
+    Text for terminals with the entities styled by ANSI escape sequences, options['ansi_styles']
+    overriding the DEFAULT_ANSI_STYLES of each kind of entity. Escape characters in the Tweet
+    itself are dropped.
+    """
+
+    name = 'ansi'
+
+    def __init__(self, options = {}):
+        Renderer.__init__(self, options)
+        self.styles = dict(DEFAULT_ANSI_STYLES.items() + self.options.get('ansi_styles', {}).items())
+
+    def text(self, chunk):
+        return chunk.replace(u'\x1b', u'')
+
+    def entity(self, entity, chunk):
+        return u'\x1b[%sm%s\x1b[0m' % (self.styles[entity_type(entity)], self.text(chunk))
+
+class SpanRenderer(Renderer):
+    """
+    A JSON serializable list of spans covering the text, each a dict with its 'type' ('text' or
+    the entity_type), 'text' and 'indices', and for entities the 'value' (without the symbol),
+    'href' and, for lists, 'list_slug'. The indices are in options['index_unit'], 'python' by
+    default or 'utf16' or 'codepoint'.
+    """
+
+    name = 'spans'
+
+    def render(self, text, segments):
+        spans = []
+        for entity, start, end in segments:
+            span = {'type': 'text', 'text': text[start:end], 'indices': [start, end]}
+            if entity is not None:
+                span['type'] = entity_type(entity)
+                span['value'] = entity.get('url') or entity.get('hashtag') or entity.get('screen_name') or entity.get('cashtag')
+                span['href'] = self.href(entity)
+                if entity.get('list_slug'):
+                    span['list_slug'] = entity['list_slug']
+            spans.append(span)
+        unit = self.options.get('index_unit', 'python')
+        if unit != 'python':
+            spans = OffsetMap(text).convert_entities(spans, unit)
+        return spans
+
+RENDERERS = {
+    'html':     HtmlRenderer,
+    'markdown': MarkdownRenderer,
+    'ansi':     AnsiRenderer,
+    'spans':    SpanRenderer,
+}
+
+def render(text, formats = ('html',), options = {}, entities = None, analysis = None):
+    """
+    Renders text in each of formats and returns a dict from format name to output. A format is a
+    name from RENDERERS, built with options, or a Renderer instance. The entities are extracted
+    once for all of them, the way Autolink.auto_link extracts them, unless they are given.
+    """
+    text = analysis.text if analysis is not None else force_unicode(text)
+    renderers = []
+    for renderer in formats:
+        if not isinstance(renderer, Renderer):
+            if not renderer in RENDERERS:
+                raise ValueError('Unknown format %r, expected one of %s' % (renderer, ', '.join(sorted(RENDERERS.keys()))))
+            renderer = RENDERERS[renderer](options)
+        renderers.append(renderer)
+    if entities is None:
+        entities = Extractor(text, analysis = analysis).extract_entities_with_indices({'extract_url_without_protocol': False})
+    text_segments = segments(text, entities)
+    return dict([(renderer.name, renderer.render(text, text_segments)) for renderer in renderers])
@@ -0,0 +1,414 @@
+# encoding=utf-8
+
+# A linear time replacement for REGEXEN['valid_url'] and REGEXEN['valid_ascii_domain'].
+#
+# Both patterns nest quantifiers (subdomain labels inside a repeated group, followed by a TLD
+# alternation with well over a thousand entries) so the regex engine backtracks through every
+# way of splitting a dotted run into labels, at every starting position. A long run of dotted
+# words without a TLD takes quadratic time times the size of the alternation.
+#
+# UrlScanner finds exactly the matches the regex engine would, in the same order, by following
+# the engine's backtracking order explicitly: the domain label chain starting at each position
+# is only resolved once and shared, TLDs are looked up in a trie, and the path and query are
+# scanned with the same greedy-then-give-back rules the patterns use. The only regexes it runs
+# are single character classes and runs of them, which can't backtrack.
+import re, time
+from bisect import bisect_left, bisect_right
+
+from twitter_text.regex import REGEXEN, DOMAIN_VALID_CHARS
+
+FLAGS = re.IGNORECASE | re.UNICODE
+
+# The values of the url_engine option of Extractor and the options that configure the scanner
+URL_ENGINES = ('regex', 'linear')
+URL_ENGINE_OPTIONS = ('url_engine', 'url_max_steps', 'url_timeout')
+
+# Don't check the clock more often than this many steps
+TIMEOUT_CHECK_INTERVAL = 256
+
+class ScanBudgetExceeded(Exception):
+    pass
+
+class CharClass(object):
+    """
+    Membership test for a single character class, memoized per character. The class is matched
+    with the same flags as in the full pattern so case folding behaves identically.
+    """
+
+    def __init__(self, regex):
+        self.regex = regex
+        self.cache = {}
+
+    def __call__(self, char):
+        try:
+            return self.cache[char]
+        except KeyError:
+            match = self.regex.match(char)
+            result = self.cache[char] = match is not None and match.end() == 1
+            return result
+
+# single characters
+IS_PRECEDING_CHAR = CharClass(REGEXEN['valid_url_preceding_chars'])
+IS_DOMAIN_CHAR = CharClass(re.compile(DOMAIN_VALID_CHARS, FLAGS))
+IS_PATH_CHAR = CharClass(REGEXEN['valid_general_url_path_chars'])
+IS_PATH_ENDING_CHAR = CharClass(REGEXEN['valid_url_path_ending_chars'])
+IS_QUERY_CHAR = CharClass(REGEXEN['valid_url_query_chars'])
+IS_QUERY_ENDING_CHAR = CharClass(REGEXEN['valid_url_query_ending_chars'])
+# a TLD must not be followed by one of these, see the lookahead in valid_gTLD
+IS_TLD_CONTINUATION = CharClass(re.compile(ur'[0-9a-z]', FLAGS))
+
+# runs of characters
+DOMAIN_LABEL_RUN = re.compile(ur'(?:%s|[_\-])+' % DOMAIN_VALID_CHARS, FLAGS)
+ASCII_LABEL_RUN = re.compile(ur'(?:[A-Za-z0-9\-_]|[%s])+' % REGEXEN['latin_accents'].pattern, FLAGS)
+PATH_RUN = re.compile(ur'(?:%s)+' % REGEXEN['valid_general_url_path_chars'].pattern, FLAGS)
+QUERY_RUN = re.compile(ur'(?:%s)+' % REGEXEN['valid_url_query_chars'].pattern, FLAGS)
+PORT = re.compile(ur':([0-9]+)')
+PROTOCOL = re.compile(ur'https?:\/\/', FLAGS)
+
+# Characters the regex engine treats as equal under IGNORECASE | UNICODE although lower() maps
+# them to different characters, such as i and dotless i or s and long s (see _equivalences in
+# sre_compile). Every character is folded to the first one of its group.
+SRE_CASE_EQUIVALENCES = (
+    (0x69, 0x131),
+    (0x73, 0x17f),
+    (0xb5, 0x3bc),
+    (0x345, 0x3b9, 0x1fbe),
+    (0x3b2, 0x3d0),
+    (0x3b5, 0x3f5),
+    (0x3b8, 0x3d1),
+    (0x3ba, 0x3f0),
+    (0x3c0, 0x3d6),
+    (0x3c1, 0x3f1),
+    (0x3c2, 0x3c3),
+    (0x3c6, 0x3d5),
+    (0x1e61, 0x1e9b),
+)
+_CASE_FOLDS = {}
+for _group in SRE_CASE_EQUIVALENCES:
+    for _codepoint in _group[1:]:
+        _CASE_FOLDS[unichr(_codepoint)] = unichr(_group[0])
+_folded = {}
+
+def fold_case(char):
+    """
+    Returns the character every character that matches char in a case insensitive pattern
+    folds to.
+    """
+    try:
+        return _folded[char]
+    except KeyError:
+        lower = char.lower()
+        folded = _folded[char] = _CASE_FOLDS.get(lower, lower)
+        return folded
+
+def _tld_alternatives(regex):
+    # valid_gTLD and valid_ccTLD are both (?:(?:tld|tld|...)(?=[^0-9a-z]|$))
+    prefix, suffix = u'(?:(?:', u')(?=[^0-9a-z]|$))'
+    pattern = regex.pattern
+    assert pattern.startswith(prefix) and pattern.endswith(suffix)
+    return pattern[len(prefix):-len(suffix)].split(u'|')
+
+def _build_tld_trie():
+    # maps each TLD to its position in the gTLD then ccTLD alternation, the regex engine picks
+    # the first alternative that matches
+    trie = {}
+    for priority, tld in enumerate(_tld_alternatives(REGEXEN['valid_gTLD']) + _tld_alternatives(REGEXEN['valid_ccTLD'])):
+        node = trie
+        for char in tld:
+            node = node.setdefault(fold_case(char), {})
+        node.setdefault(None, priority)
+    return trie
+
+TLD_TRIE = _build_tld_trie()
+
+class UrlMatch(object):
+    """
+    The subset of the re match object interface Extractor uses, for a match found by UrlScanner.
+    """
+
+    def __init__(self, string, start, end, groups = ()):
+        self.string = string
+        self._start = start
+        self._end = end
+        self._groups = groups
+
+    def start(self):
+        return self._start
+
+    def end(self):
+        return self._end
+
+    def span(self):
+        return self._start, self._end
+
+    def group(self):
+        return self.string[self._start:self._end]
+
+    def groups(self):
+        return self._groups
+
+class Runs(object):
+    """
+    The maximal runs of a character class in a string, found with one pass of the run regex,
+    so the end of the run around any position is a binary search away.
+    """
+
+    def __init__(self, regex, string):
+        self.starts = []
+        self.ends = []
+        for match in regex.finditer(string):
+            self.starts.append(match.start())
+            self.ends.append(match.end())
+
+    def end(self, position):
+        index = bisect_right(self.starts, position) - 1
+        if index >= 0 and position < self.ends[index]:
+            return self.ends[index]
+        return position
+
+class UrlScanner(object):
+    """
+    Finds URLs in text in time linear in its length. finditer() yields the same matches, with the
+    same groups, as REGEXEN['valid_url'].finditer(text) and ascii_domain_finditer() does the same
+    for REGEXEN['valid_ascii_domain'].
+
+    max_steps and timeout (in seconds) bound the work done for a single text; ScanBudgetExceeded
+    is raised once either is used up.
+    """
+
+    def __init__(self, text, max_steps = None, timeout = None):
+        self.text = text
+        self.max_steps = max_steps
+        self.deadline = time.time() + timeout if timeout is not None else None
+        self.steps = 0
+        self._next_clock_check = TIMEOUT_CHECK_INTERVAL
+
+    def _step(self, count = 1):
+        self.steps += count
+        if self.max_steps is not None and self.steps > self.max_steps:
+            raise ScanBudgetExceeded('URL scan exceeded %d steps' % self.max_steps)
+        if self.deadline is not None and self.steps >= self._next_clock_check:
+            if time.time() > self.deadline:
+                raise ScanBudgetExceeded('URL scan timed out')
+            self._next_clock_check = self.steps + TIMEOUT_CHECK_INTERVAL
+
+    def finditer(self):
+        text = self.text
+        length = len(text)
+        domains = _DomainMatcher(self, text, DOMAIN_LABEL_RUN, True)
+        position = 0
+        while position <= length:
+            self._step()
+            match = None
+            # valid_url_preceding_chars is a character or the start of the string, in that order
+            if position < length and IS_PRECEDING_CHAR(text[position]):
+                match = self._match_url(domains, position, position + 1)
+            if match is None and position == 0:
+                match = self._match_url(domains, 0, 0)
+            if match is None:
+                position += 1
+                continue
+            yield match
+            position = match.end()
+
+    def ascii_domain_finditer(self, domain):
+        domains = _DomainMatcher(self, domain, ASCII_LABEL_RUN, False)
+        position = 0
+        while position < len(domain):
+            self._step()
+            end = domains.match(position)
+            if end is None:
+                position += 1
+                continue
+            yield UrlMatch(domain, position, end)
+            position = end
+
+    def _match_url(self, domains, start, url_start):
+        text = self.text
+        protocol_match = PROTOCOL.match(text, url_start)
+        domain_start = protocol_match.end() if protocol_match else url_start
+        domain_end = domains.match(domain_start)
+        if domain_end is None and protocol_match:
+            # the protocol is optional so the engine retries without it
+            domain_start = url_start
+            domain_end = domains.match(domain_start)
+            protocol_match = None
+        if domain_end is None:
+            return None
+
+        position = domain_end
+        port = path = query = None
+
+        port_match = PORT.match(text, position)
+        if port_match:
+            port = port_match.group(1)
+            position = port_match.end()
+
+        if position < len(text) and text[position] == u'/':
+            path_start = position
+            position += 1
+            while True:
+                end = self._match_path_segment(position)
+                if end is None:
+                    break
+                position = end
+            path = text[path_start:position]
+
+        if position < len(text) and text[position] == u'?':
+            query_end = self._match_query(position + 1)
+            if query_end is not None:
+                query = text[position:query_end]
+                position = query_end
+
+        groups = (
+            text[start:position],
+            text[start:url_start],
+            text[url_start:position],
+            protocol_match.group() if protocol_match else None,
+            text[domain_start:domain_end],
+            port,
+            path,
+            query,
+        )
+        return UrlMatch(text, start, position, groups)
+
+    def _path_run_end(self, position):
+        match = PATH_RUN.match(self.text, position)
+        if match:
+            self._step(match.end() - position)
+            return match.end()
+        return position
+
+    def _balanced_parens_end(self, position):
+        # valid_url_balanced_parens: \(path_chars+\)
+        text = self.text
+        if position < len(text) and text[position] == u'(':
+            end = self._path_run_end(position + 1)
+            if end > position + 1 and end < len(text) and text[end] == u')':
+                return end + 1
+        return None
+
+    def _match_path_segment(self, start):
+        # One repetition of valid_url_path. The ending chars pattern isn't grouped where it's
+        # interpolated, so its balanced parens alternative becomes an alternative of its own:
+        #   path_chars* (?:balanced_parens ' ' path_chars*)* ending_char
+        # | balanced_parens
+        # | path_chars+ /
+        # The ending char can't be the character after the last run, as ending chars are all path
+        # chars, so the engine gives back characters run by run until one ends with an ending char.
+        # A slash is an ending char too, so the last alternative only matches when the first does.
+        text = self.text
+        runs = [(start, self._path_run_end(start))]
+        while True:
+            parens_end = self._balanced_parens_end(runs[-1][1])
+            if parens_end is None or parens_end >= len(text) or text[parens_end] != u' ':
+                break
+            runs.append((parens_end + 1, self._path_run_end(parens_end + 1)))
+
+        for run_start, run_end in reversed(runs):
+            for position in xrange(run_end - 1, run_start - 1, -1):
+                self._step()
+                if IS_PATH_ENDING_CHAR(text[position]):
+                    return position + 1
+        return self._balanced_parens_end(start)
+
+    def _match_query(self, start):
+        # query_chars* query_ending_char
+        text = self.text
+        match = QUERY_RUN.match(text, start)
+        if not match:
+            return None
+        for position in xrange(match.end() - 1, start - 1, -1):
+            self._step()
+            if IS_QUERY_ENDING_CHAR(text[position]):
+                return position + 1
+        return None
+
+class _DomainMatcher(object):
+    """
+    Matches label\.(label\.)*tld at a position of a string the way the regex engine would: the
+    greedy repetition of labels means the last label in the chain that is followed by a TLD wins.
+    The result for every label start is remembered, so following a chain of n labels from any
+    number of starting points costs O(n) overall.
+
+    With strict set, labels follow valid_subdomain and valid_domain_name: they start and end with
+    a domain char and the last one can't contain underscores. Otherwise any run of
+    ASCII_LABEL_RUN characters is a label, as in valid_ascii_domain.
+    """
+
+    def __init__(self, scanner, string, run_regex, strict):
+        self.scanner = scanner
+        self.string = string
+        self.strict = strict
+        self.runs = Runs(run_regex, string)
+        self.underscores = [index for index, char in enumerate(string) if char == u'_'] if strict else []
+        self.chains = {}
+        self.tlds = {}
+
+    def match(self, position):
+        """
+        Returns the end of the domain starting at position or None.
+        """
+        # walk the chain of labels until one is already resolved or the chain ends
+        starts = []
+        result = None
+        while True:
+            if position in self.chains:
+                result = self.chains[position]
+                break
+            label_end = self._label_end(position)
+            if label_end is None:
+                result = None
+                break
+            starts.append((position, label_end))
+            position = label_end + 1
+        # resolve from the end of the chain back towards the start
+        for start, label_end in reversed(starts):
+            if result is None and self._valid_last_label(start, label_end):
+                result = self._tld_end(label_end + 1)
+            self.chains[start] = result
+        return result
+
+    def _label_end(self, position):
+        # the index of the dot ending the label at position, if there is one
+        self.scanner._step()
+        string = self.string
+        end = self.runs.end(position)
+        if end == position or end >= len(string) or string[end] != u'.':
+            return None
+        if self.strict and not (IS_DOMAIN_CHAR(string[position]) and IS_DOMAIN_CHAR(string[end - 1])):
+            return None
+        return end
+
+    def _valid_last_label(self, start, end):
+        if not self.strict:
+            return True
+        index = bisect_left(self.underscores, start)
+        return index == len(self.underscores) or self.underscores[index] >= end
+
+    def _tld_end(self, position):
+        try:
+            return self.tlds[position]
+        except KeyError:
+            pass
+        string = self.string
+        node = TLD_TRIE
+        best_priority = best_end = None
+        index = position
+        while index < len(string):
+            self.scanner._step()
+            node = node.get(fold_case(string[index]))
+            if node is None:
+                break
+            index += 1
+            priority = node.get(None)
+            if priority is not None and (best_priority is None or priority < best_priority):
+                if index == len(string) or not IS_TLD_CONTINUATION(string[index]):
+                    best_priority, best_end = priority, index
+        if best_end is None:
+            match = REGEXEN['valid_punycode'].match(string, position)
+            if match:
+                self.scanner._step(match.end() - position)
+                best_end = match.end()
+        self.tlds[position] = best_end
+        return best_end
@@ -0,0 +1,201 @@
+# encoding=utf-8
+
+# Fits text into a Tweet, or splits it into a thread, from one table of cumulative weights and
+# one extraction instead of measuring candidate prefixes with tweet_length.
+import unicodedata
+
+from twitter_text.extractor import Extractor
+from twitter_text.unicode import force_unicode, nfc_with_positions
+from twitter_text.validation import Validation
+from twitter_text.weighting import EMOJI_SEQUENCE, get_config
+
+DEFAULT_NUMBERING = u' (%d/%d)'
+
+class Splitter(object):
+    """
+    Measures every prefix of a text the way Validation.tweet_length would. The text is weighed and
+    its entities extracted once, and the length of any slice between two break points is then two
+    subtractions.
+
+    The text is normalized to NFC, like tweet_length does, and the texts returned are slices of
+    the normalized text. Slices never cut through a URL, mention, list, hashtag, cashtag or emoji
+    sequence, separate a combining mark from the character before it or split a surrogate pair.
+
+    The options are the ones tweet_length takes, such as 'config' and the URL lengths.
+    """
+
+    def __init__(self, text, options = {}):
+        self.text = nfc_with_positions(force_unicode(text))[0]
+        self.options = dict(options)
+        self.options.pop('entities', None)
+        self.config = get_config(self.options.get('config'))
+        for key in self.config.url_lengths:
+            if not key in self.options:
+                self.options[key] = self.config.url_lengths[key]
+        self._measure()
+
+    def _measure(self):
+        text = self.text
+        size = len(text)
+
+        self._weights = [0] * (size + 1)
+        total = 0
+        for index, weight in enumerate(self.config.char_weights(text)):
+            total += weight
+            self._weights[index + 1] = total
+
+        # what each URL adds to the length on top of its characters, counted where it ends
+        adjustments = [0] * (size + 1)
+        self.breakable = [True] * (size + 1)
+        spans = []
+        # lengths only ever grow with the text unless a URL counts for less than its characters
+        self._monotonic = True
+        extractor = Extractor(text)
+        for url in extractor.extract_urls_with_indices():
+            start, end = url['indices']
+            short_length = self.options.get('short_url_length_https') if url['url'].lower().find('https://') > -1 else self.options.get('short_url_length')
+            adjustments[end] += short_length - (end - start)
+            if (self._weights[end] - self._weights[start]) / self.config.scale - 1 + short_length - (end - start) < 0:
+                self._monotonic = False
+            spans.append((start, end))
+        spans.extend([tuple(entity['indices']) for entity in extractor.extract_entities_with_indices()])
+        spans.extend([match.span() for match in EMOJI_SEQUENCE.finditer(text)])
+        for start, end in spans:
+            for index in xrange(start + 1, end):
+                self.breakable[index] = False
+        for index in xrange(1, size):
+            char = text[index]
+            if unicodedata.combining(char) or (u'\udc00' <= char <= u'\udfff' and u'\ud800' <= text[index - 1] <= u'\udbff'):
+                self.breakable[index] = False
+
+        self._adjustments = adjustments
+        running = 0
+        for index in xrange(size + 1):
+            running += adjustments[index]
+            adjustments[index] = running
+
+    def length(self, start = 0, end = None):
+        """
+        Returns what tweet_length would for text[start:end], where start and end are break points.
+        """
+        if end is None:
+            end = len(self.text)
+        return (self._weights[end] - self._weights[start]) / self.config.scale + self._adjustments[end] - self._adjustments[start]
+
+    def _limit(self, limit):
+        return self.config.max_length if limit is None else limit
+
+    def fit(self, limit = None, start = 0):
+        """
+        Returns the end of the longest slice of the text from start that isn't longer than limit,
+        which defaults to the maximum length of the configuration. Returns start if not even the
+        first entity or character fits.
+        """
+        limit = self._limit(limit)
+        best = start
+        for end in xrange(start + 1, len(self.text) + 1):
+            if not self.breakable[end]:
+                continue
+            if self.length(start, end) <= limit:
+                best = end
+            elif self._monotonic:
+                break
+        return best
+
+    def truncate(self, limit = None, ellipsis = u''):
+        """
+        Returns the text if it fits in limit, or else its longest prefix that fits followed by
+        ellipsis.
+        """
+        limit = self._limit(limit)
+        if self.length() <= limit:
+            return self.text
+        ellipsis = force_unicode(ellipsis)
+        limit -= self._reserve(ellipsis)
+        return self.text[:self._verify(0, self.fit(limit), limit)].rstrip() + ellipsis
+
+    def split(self, limit = None, numbering = DEFAULT_NUMBERING):
+        """
+        Splits the text into segments that each fit in limit, breaking at whitespace where it
+        can, and returns them. Unless numbering is None or the text fits in one segment every
+        segment gets numbering % (i, n) appended, " (1/3)" by default, with room for it left in
+        each segment. Raises ValueError if an entity or character doesn't fit in a segment of
+        its own.
+        """
+        limit = self._limit(limit)
+        segments = self._split(limit)
+        if numbering is None or len(segments) == 1:
+            return segments
+        # numbered there are at least as many segments
+        count = len(segments)
+        while True:
+            # the widest suffix has as many digits as the count in both places
+            segments = self._split(limit - self._reserve(numbering % (count, count)))
+            if len(str(len(segments))) <= len(str(count)):
+                break
+            count = len(segments)
+        count = len(segments)
+        return [segment + numbering % (index + 1, count) for index, segment in enumerate(segments)]
+
+    def _reserve(self, suffix):
+        # the weight of a suffix can round the total up by at most one more than its own length
+        if not suffix:
+            return 0
+        return -(-self.config.weight(suffix) / self.config.scale) + 1
+
+    def _split(self, limit):
+        text = self.text
+        segments = []
+        start = self._skip_space(0)
+        while start < len(text):
+            end = self.fit(limit, start)
+            if end < len(text):
+                end = self._break_at_space(start, end)
+            end = self._verify(start, end, limit)
+            if end == start:
+                raise ValueError('%r does not fit in %d characters' % (text[start:start + 40], limit))
+            segments.append(text[start:end].rstrip())
+            start = self._skip_space(end)
+        return segments
+
+    def _verify(self, start, end, limit):
+        # A slice on its own can parse differently from the same part of the whole text, foo.co
+        # cut from foo.cool becomes a URL for example, so it is measured once. In the rare case it
+        # no longer fits it is cut back to the whitespace before it and measured again, or one
+        # break point at a time within a word that has no whitespace to cut back to.
+        while end > start and Validation(self.text[start:end].rstrip()).tweet_length(self.options) > limit:
+            space = end - 1
+            while space > start and not (self.breakable[space] and self.text[space].isspace()):
+                space -= 1
+            if space > start:
+                end = space
+                continue
+            end -= 1
+            while not self.breakable[end]:
+                end -= 1
+        return end
+
+    def _skip_space(self, index):
+        while index < len(self.text) and self.text[index].isspace():
+            index += 1
+        return index
+
+    def _break_at_space(self, start, end):
+        # the last break point before whitespace, if there is one after start
+        for index in xrange(end, start, -1):
+            if self.breakable[index] and self.text[index].isspace():
+                return index
+        return end
+
+def truncate(text, limit = None, ellipsis = u'', options = {}):
+    """
+    Returns the longest prefix of text that fits in limit without cutting an entity, followed by
+    ellipsis if anything was cut. See Splitter.
+    """
+    return Splitter(text, options).truncate(limit, ellipsis)
+
+def split_thread(text, limit = None, numbering = DEFAULT_NUMBERING, options = {}):
+    """
+    Splits text into a thread of segments that each fit in limit. See Splitter.split.
+    """
+    return Splitter(text, options).split(limit, numbering)
@@ -0,0 +1,133 @@
+# encoding=utf-8
+
+import codecs, mmap
+
+from twitter_text.extractor import Extractor
+
+DEFAULT_WINDOW_SIZE = 64 * 1024
+DEFAULT_MAX_ENTITY_LENGTH = 4 * 1024
+
+class StreamingExtractor(object):
+    """
+    Extracts entities from a document too large to hold in memory as one string, such as a
+    log file or chat transcript. The file is read through mmap (or in buffered chunks for
+    files that can't be mapped) and decoded incrementally, and the text is processed one
+    window of about window_size characters at a time, so memory use doesn't depend on the
+    size of the document.
+
+    Windows end just after a newline, or a space that doesn't follow a closing paren (a URL
+    path can continue past one of those). No entity contains such a character and text after
+    it matches exactly as at the start of a string, so cutting there finds exactly the
+    entities Extractor would find in the whole text. When a window has no such character the
+    next one overlaps it by max_entity_length characters instead, and entities found twice
+    are dropped; longer entities that straddle such a cut may be shortened.
+
+    source is a file name or a file object opened in binary mode.
+    """
+
+    def __init__(self, source, window_size = DEFAULT_WINDOW_SIZE, max_entity_length = DEFAULT_MAX_ENTITY_LENGTH, encoding = 'utf-8', use_mmap = True):
+        if window_size < 4 * max_entity_length:
+            raise ValueError('window_size must be at least four times max_entity_length')
+        self.source = source
+        self.window_size = window_size
+        self.max_entity_length = max_entity_length
+        self.encoding = encoding
+        self.use_mmap = use_mmap
+
+    def iter_entities(self, types = Extractor.ENTITY_TYPES, options = {}):
+        """
+        Yields the entities Extractor.iter_entities would yield for the whole document, with
+        indices relative to the start of the decoded document.
+        """
+        buf = u''
+        # index in the document of buf[0]
+        base = 0
+        # entities starting before this index of the document have already been yielded
+        emit_from = 0
+        for chunk in self._decoded_chunks():
+            buf += chunk
+            while len(buf) >= self.window_size:
+                end, emit_until, next_start = self._cut(buf)
+                for entity in self._window_entities(buf[:end], base, emit_from, types, options):
+                    if entity['indices'][0] >= base + emit_until:
+                        break
+                    emit_from = max(emit_from, entity['indices'][1])
+                    yield entity
+                emit_from = max(emit_from, base + emit_until)
+                buf = buf[next_start:]
+                base += next_start
+        for entity in self._window_entities(buf, base, emit_from, types, options):
+            yield entity
+
+    def extract_entities_with_indices(self, options = {}):
+        return list(self.iter_entities(options = options))
+
+    def _cut(self, buf):
+        """
+        Returns where the window at the start of buf ends, the index the entities taken from it
+        must start before and where the next window starts.
+        """
+        size = self.window_size
+        cut = buf.rfind(u'\n', 0, size) + 1
+        space = buf.rfind(u' ', 0, size)
+        while space > 0 and buf[space - 1] == u')':
+            space = buf.rfind(u' ', 0, space)
+        cut = max(cut, space + 1)
+        if cut > 0:
+            return cut, cut, cut
+        # no safe place to cut, the windows have to overlap
+        emit_until = size - self.max_entity_length
+        return size, emit_until, emit_until - self.max_entity_length
+
+    def _window_entities(self, text, base, emit_from, types, options):
+        if not text:
+            return
+        for entity in Extractor(text).iter_entities(types, options):
+            start, end = entity['indices']
+            if base + start < emit_from:
+                continue
+            entity['indices'] = [base + start, base + end]
+            yield entity
+
+    def _decoded_chunks(self):
+        decoder = codecs.getincrementaldecoder(self.encoding)()
+        for chunk in self._chunks():
+            text = decoder.decode(chunk)
+            if text:
+                yield text
+        text = decoder.decode('', True)
+        if text:
+            yield text
+
+    def _chunks(self):
+        if isinstance(self.source, basestring):
+            source = open(self.source, 'rb')
+            try:
+                for chunk in self._file_chunks(source):
+                    yield chunk
+            finally:
+                source.close()
+        else:
+            for chunk in self._file_chunks(self.source):
+                yield chunk
+
+    def _file_chunks(self, source):
+        mapped = None
+        if self.use_mmap:
+            try:
+                mapped = mmap.mmap(source.fileno(), 0, access = mmap.ACCESS_READ)
+            except (AttributeError, EnvironmentError, ValueError):
+                # not a real file, or an empty one
+                mapped = None
+        if mapped is None:
+            while True:
+                chunk = source.read(self.window_size)
+                if not chunk:
+                    break
+                yield chunk
+            return
+        try:
+            for offset in xrange(0, len(mapped), self.window_size):
+                yield mapped[offset:offset + self.window_size]
+        finally:
+            mapped.close()
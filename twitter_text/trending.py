@@ -0,0 +1,176 @@
+# encoding=utf-8
+
+import array, heapq, math, time, zlib
+
+from twitter_text.extractor import Extractor
+from twitter_text.keys import fold_entity
+
+DEFAULT_EPSILON = 0.0005
+DEFAULT_DELTA = 0.01
+
+def normalize_entity(value):
+    """
+    An entity value NFKC normalized and case folded, so #Python, #PYTHON and #Ｐｙｔｈｏｎ all
+    count towards the same key. TrendingEntities counts under the canonical keys of
+    twitter_text.keys, which are this with the symbol of the kind in front.
+    """
+    return fold_entity(value)
+
+class CountMinSketch(object):
+    """
+    Approximate counts for any number of keys in fixed memory. Estimates are never below the
+    true count, and with probability 1 - delta they exceed it by at most epsilon times the total
+    of all counts, where width = ceil(e / epsilon) and depth = ceil(ln(1 / delta)).
+    """
+
+    def __init__(self, width, depth):
+        self.width = width
+        self.depth = depth
+        self.total = 0
+        self.table = array.array('L', [0]) * (width * depth)
+
+    @classmethod
+    def from_error(cls, epsilon = DEFAULT_EPSILON, delta = DEFAULT_DELTA):
+        return cls(int(math.ceil(math.e / epsilon)), int(math.ceil(math.log(1.0 / delta))))
+
+    def _cells(self, key):
+        # double hashing, the rows use h1 + row * h2 as their hash functions
+        encoded = key.encode('utf-8')
+        h1 = zlib.crc32(encoded) & 0xffffffff
+        h2 = zlib.adler32(encoded) & 0xffffffff | 1
+        width = self.width
+        return [row * width + (h1 + row * h2) % width for row in xrange(self.depth)]
+
+    def add(self, key, count = 1):
+        """
+        Adds count to key and returns its new estimate. Only the lowest counters are raised
+        (conservative update), which keeps the bound and lowers the overestimate.
+        """
+        cells = self._cells(key)
+        table = self.table
+        estimate = min([table[cell] for cell in cells]) + count
+        for cell in cells:
+            if table[cell] < estimate:
+                table[cell] = estimate
+        self.total += count
+        return estimate
+
+    def estimate(self, key):
+        table = self.table
+        return min([table[cell] for cell in self._cells(key)])
+
+    def clear(self):
+        self.table = array.array('L', [0]) * (self.width * self.depth)
+        self.total = 0
+
+class TopK(object):
+    """
+    The keys with the highest estimates in a CountMinSketch. Up to capacity candidates are kept
+    in a min-heap; a key displaces the lowest candidate once its estimate is higher.
+    """
+
+    def __init__(self, capacity, sketch):
+        self.capacity = capacity
+        self.sketch = sketch
+        self.counts = {}
+        self.heap = []
+
+    def add(self, key, count = 1):
+        estimate = self.sketch.add(key, count)
+        counts = self.counts
+        if key in counts:
+            # the heap entry is now stale, it's refreshed when it reaches the top
+            counts[key] = estimate
+            return
+        if len(counts) < self.capacity:
+            counts[key] = estimate
+            heapq.heappush(self.heap, (estimate, key))
+            return
+        heap = self.heap
+        while heap[0][0] != counts[heap[0][1]]:
+            lowest_key = heap[0][1]
+            heapq.heapreplace(heap, (counts[lowest_key], lowest_key))
+        if estimate > heap[0][0]:
+            del counts[heapq.heapreplace(heap, (estimate, key))[1]]
+            counts[key] = estimate
+
+    def clear(self):
+        self.sketch.clear()
+        self.counts = {}
+        self.heap = []
+
+class SlidingTopK(object):
+    """
+    Approximate top-K keys over the last window seconds. Time is divided into buckets of
+    bucket_seconds, each with its own sketch and candidates, and buckets are reused once they
+    fall out of the window, so memory doesn't grow with the number of keys or with time.
+    """
+
+    def __init__(self, k = 10, window = 3600, bucket_seconds = 60, capacity = None, epsilon = DEFAULT_EPSILON, delta = DEFAULT_DELTA):
+        self.k = k
+        self.bucket_seconds = bucket_seconds
+        self.bucket_count = max(1, int(math.ceil(float(window) / bucket_seconds)))
+        capacity = capacity or 4 * k
+        self.buckets = [TopK(capacity, CountMinSketch.from_error(epsilon, delta)) for i in xrange(self.bucket_count)]
+        # the time bucket number each slot holds, None while unused
+        self.slots = [None] * self.bucket_count
+        self.latest = None
+
+    def _advance(self, number):
+        if self.latest is None or number > self.latest:
+            self.latest = number
+
+    def _live(self, number):
+        return self.latest is not None and self.latest - self.bucket_count < number <= self.latest
+
+    def add(self, key, timestamp = None, count = 1):
+        number = int((timestamp if timestamp is not None else time.time()) // self.bucket_seconds)
+        self._advance(number)
+        if not self._live(number):
+            # too old to be in the window
+            return
+        slot = number % self.bucket_count
+        if self.slots[slot] != number:
+            self.buckets[slot].clear()
+            self.slots[slot] = number
+        self.buckets[slot].add(key, count)
+
+    def top(self, k = None, now = None):
+        """
+        Returns up to k (key, estimated count) pairs, highest first, for the window ending at now
+        (or at the latest timestamp added).
+        """
+        k = k or self.k
+        if now is not None:
+            self._advance(int(now // self.bucket_seconds))
+        live = [bucket for slot, bucket in enumerate(self.buckets) if self.slots[slot] is not None and self._live(self.slots[slot])]
+        candidates = set()
+        for bucket in live:
+            candidates.update(bucket.counts)
+        counts = [(sum([bucket.sketch.estimate(key) for bucket in live]), key) for key in candidates]
+        return [(key, int(count)) for count, key in heapq.nlargest(k, counts)]
+
+class TrendingEntities(object):
+    """
+    Counts the hashtags and cashtags (and optionally mentions) of a stream of Tweets under their
+    canonical keys (u'#python', u'$aapl', u'@jack') and reports the approximate top-K of each
+    over a sliding time window in fixed memory. The keyword arguments are passed to SlidingTopK.
+    """
+
+    def __init__(self, kinds = ('hashtags', 'cashtags'), **kwargs):
+        self.kinds = tuple(kinds)
+        self.counters = dict([(kind, SlidingTopK(**kwargs)) for kind in self.kinds])
+
+    def add_text(self, text, timestamp = None):
+        if timestamp is None:
+            timestamp = time.time()
+        for entity in Extractor(text).iter_entities(self.kinds, {'canonical_keys': True}):
+            if 'hashtag' in entity:
+                self.counters['hashtags'].add(entity['key'], timestamp)
+            elif 'cashtag' in entity:
+                self.counters['cashtags'].add(entity['key'], timestamp)
+            elif 'screen_name' in entity:
+                self.counters['mentions'].add(entity['key'], timestamp)
+
+    def top(self, kind = 'hashtags', k = None, now = None):
+        return self.counters[kind].top(k, now)
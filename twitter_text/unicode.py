@@ -1,4 +1,4 @@
-import types, datetime
+import re, sys, types, datetime, unicodedata
 from decimal import Decimal
 
 # borrowed from django.utils.encoding
@@ -32,6 +32,15 @@ def force_unicode(s, encoding='utf-8', strings_only=False, errors='strict'):
 
     If strings_only is True, don't convert (some) non-string-like objects.
     """
+    # Fast paths for the common cases of exact unicode and byte strings; subclasses such as
+    # Django's SafeString still go through the full conversion below.
+    if type(s) is unicode:
+        return s
+    if type(s) is str:
+        try:
+            return s.decode(encoding, errors)
+        except UnicodeDecodeError, e:
+            raise TwitterTextUnicodeDecodeError(s, *e.args)
     if strings_only and is_protected_type(s):
         return s
     try:
@@ -69,3 +78,105 @@ def force_unicode(s, encoding='utf-8', strings_only=False, errors='strict'):
             s = ' '.join([force_unicode(arg, encoding, strings_only,
                     errors) for arg in s])
     return s
+
+def decode_many(values, encoding='utf-8', errors='strict'):
+    """
+    Decodes a batch of byte strings, such as tweets read from a log. Unlike force_unicode this
+    never raises for a bad item; it returns a list of (text, error) pairs in the same order
+    where error is None or the TwitterTextUnicodeDecodeError describing the invalid sequence
+    and text is None for the items that failed. Unicode items are passed through untouched.
+    """
+    results = []
+    append = results.append
+    for value in values:
+        value_type = type(value)
+        if value_type is unicode:
+            append((value, None))
+            continue
+        try:
+            if value_type is str:
+                append((value.decode(encoding, errors), None))
+            else:
+                append((force_unicode(value, encoding, errors=errors), None))
+        except UnicodeDecodeError, e:
+            if not isinstance(e, TwitterTextUnicodeDecodeError):
+                e = TwitterTextUnicodeDecodeError(value, *e.args)
+            append((None, e))
+    return results
+
+# Built on first use by _nfc_suspects()
+_nfc_suspects_pattern = None
+
+def _nfc_suspects():
+    """
+    Returns a pattern matching runs of the characters that NFC can change or combine with the character
+    before them: combining marks, characters NFC maps to something else and the second halves
+    of canonical compositions, including Hangul vowel and trailing consonant jamo.
+    """
+    global _nfc_suspects_pattern
+    if _nfc_suspects_pattern is not None:
+        return _nfc_suspects_pattern
+
+    suspects = set(range(0x1161, 0x1176) + range(0x11a8, 0x11c3))
+    # nothing past the CJK compatibility ideographs supplement decomposes or combines
+    for codepoint in xrange(0x300, min(sys.maxunicode, 0x2fa1f) + 1):
+        if 0xd800 <= codepoint <= 0xdfff:
+            continue
+        char = unichr(codepoint)
+        if unicodedata.combining(char):
+            suspects.add(codepoint)
+            continue
+        decomposition = unicodedata.decomposition(char)
+        if not decomposition or decomposition.startswith('<'):
+            continue
+        if unicodedata.normalize('NFC', char) != char:
+            suspects.add(codepoint)
+        parts = decomposition.split()
+        if len(parts) == 2:
+            suspects.add(int(parts[1], 16))
+    if sys.maxunicode == 0xffff:
+        # on narrow builds astral characters are surrogate pairs that aren't checked one by one
+        suspects.update(range(0xd800, 0xe000))
+
+    ranges = []
+    for codepoint in sorted(suspects):
+        if ranges and ranges[-1][1] == codepoint - 1:
+            ranges[-1][1] = codepoint
+        else:
+            ranges.append([codepoint, codepoint])
+    escape = lambda codepoint: '\\u%04x' % codepoint if codepoint <= 0xffff else '\\U%08x' % codepoint
+    _nfc_suspects_pattern = re.compile(u'[%s]+' % u''.join([
+        escape(start) if start == end else u'%s-%s' % (escape(start), escape(end)) for start, end in ranges
+    ]).decode('unicode-escape'))
+    return _nfc_suspects_pattern
+
+def nfc_with_positions(text):
+    """
+    Returns the NFC of text and a list with the index into text that each of its characters came
+    from, or None in place of the list if text was already normalized. Only the characters around
+    the ones that can change are normalized, so everything else maps back exactly; the characters
+    produced from a changed stretch all map to its start.
+
+    An index i into text is at index bisect_left(positions, i) of the normalized text.
+    """
+    # unicodedata runs the NFC quick check itself and hands back text that passes it untouched,
+    # which is faster than any check done here, even for ASCII
+    normalized = unicodedata.normalize('NFC', text)
+    if normalized is text or normalized == text:
+        return text, None
+    suspects = _nfc_suspects()
+    pieces, positions = [], []
+    position = 0
+    for match in suspects.finditer(text):
+        # a run of suspect characters is normalized with the starter they can combine with
+        start, end = match.span()
+        start = max(position, start - 1)
+        pieces.append(text[position:start])
+        positions.extend(xrange(position, start))
+        piece = unicodedata.normalize('NFC', text[start:end])
+        pieces.append(piece)
+        positions.extend([start] * len(piece))
+        position = end
+    pieces.append(text[position:])
+    positions.extend(xrange(position, len(text)))
+    return u''.join(pieces), positions
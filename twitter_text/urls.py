@@ -0,0 +1,207 @@
+# encoding=utf-8
+
+# Parsed records for the URLs the Extractor finds: scheme, host, port, path, query, a normalized
+# form and the registrable domain. The URLs have already been validated by extraction, so they
+# are split with plain string operations, and the registrable domain comes from the bundled
+# Public Suffix List (data/public_suffix_list.dat, https://publicsuffix.org/list/) loaded into a
+# suffix trie the first time it's needed.
+import codecs, os, threading
+
+from twitter_text.cache import LRUCache
+
+PUBLIC_SUFFIX_LIST = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'public_suffix_list.dat')
+
+HOST_CACHE_SIZE = 4096
+
+DEFAULT_PORTS = {
+    u'http':    80,
+    u'https':   443,
+}
+
+# what a label of the trie is: a public suffix (RULE), an exception to a wildcard (EXCEPTION) or
+# only on the way to longer rules (NO_RULE)
+NO_RULE, RULE, EXCEPTION = 0, 1, 2
+
+class SuffixTrie(object):
+    """
+    The rules of a public suffix list in a trie of their labels, last label first. Every node is
+    a dict from label to child; a child without children of its own is stored as just its rule
+    flag, and a node with children keeps its flag under the key None. Most rules are leaves, so
+    the trie takes about a dict per top level domain.
+    """
+
+    def __init__(self, rules = ()):
+        self.root = {}
+        for rule in rules:
+            self.add(rule)
+
+    @classmethod
+    def from_file(cls, path = PUBLIC_SUFFIX_LIST):
+        """
+        Reads the rules of a file in the Public Suffix List format.
+        """
+        rules = []
+        suffix_file = codecs.open(path, 'r', 'utf-8')
+        try:
+            for line in suffix_file:
+                # rules end at the first whitespace, comments start with //
+                rule = line.split(None, 1)[0] if line.strip() else u''
+                if rule and not rule.startswith(u'//'):
+                    rules.append(rule.lower())
+        finally:
+            suffix_file.close()
+        return cls(rules)
+
+    def add(self, rule):
+        flag = RULE
+        if rule.startswith(u'!'):
+            flag, rule = EXCEPTION, rule[1:]
+        labels = rule.split(u'.')
+        labels.reverse()
+        node = self.root
+        for label in labels[:-1]:
+            child = node.get(label, NO_RULE)
+            if not isinstance(child, dict):
+                child = node[label] = {None: child}
+            node = child
+        child = node.get(labels[-1])
+        if isinstance(child, dict):
+            child[None] = flag
+        else:
+            node[labels[-1]] = flag
+
+    def suffix_length(self, labels):
+        """
+        Returns how many of the last labels of a host (given last label first) are its public
+        suffix. A top level domain without rules is a public suffix on its own.
+        """
+        length = 1
+        node = self.root
+        for position, label in enumerate(labels):
+            child = node.get(label)
+            flag = child.get(None, NO_RULE) if isinstance(child, dict) else child
+            if flag == EXCEPTION:
+                return position
+            if u'*' in node or flag == RULE:
+                length = position + 1
+            if not isinstance(child, dict):
+                break
+            node = child
+        return length
+
+_trie = None
+_trie_lock = threading.Lock()
+
+def suffix_trie():
+    """
+    Returns the trie of the bundled Public Suffix List, loading it on first use.
+    """
+    global _trie
+    if _trie is None:
+        _trie_lock.acquire()
+        try:
+            if _trie is None:
+                _trie = SuffixTrie.from_file()
+        finally:
+            _trie_lock.release()
+    return _trie
+
+def _label_key(label):
+    # the list has internationalized labels in Unicode, hosts may have them in punycode
+    if label.startswith(u'xn--'):
+        try:
+            return label[4:].encode('ascii').decode('punycode')
+        except (UnicodeError, ValueError):
+            pass
+    return label
+
+def _is_ip_address(host):
+    if host.startswith(u'['):
+        return True
+    labels = host.split(u'.')
+    return len(labels) == 4 and not [label for label in labels if not label.isdigit()]
+
+def _host_info(host):
+    host = host.lower().rstrip(u'.')
+    if not host or _is_ip_address(host):
+        return host, None
+    labels = host.split(u'.')
+    keys = [_label_key(label) for label in labels]
+    keys.reverse()
+    length = suffix_trie().suffix_length(keys)
+    if length >= len(labels):
+        # the host is a public suffix itself
+        return host, None
+    return host, u'.'.join(labels[-length - 1:])
+
+_host_cache = LRUCache(HOST_CACHE_SIZE)
+
+def host_info(host):
+    """
+    Returns the normalized host (lowercased, without a trailing dot) and its registrable domain,
+    the public suffix and the label before it, which is None for IP addresses and for hosts that
+    are public suffixes. The results for the last HOST_CACHE_SIZE hosts are cached.
+    """
+    info = _host_cache.get(host)
+    if info is None:
+        info = _host_info(host)
+        _host_cache.set(host, info)
+    return info
+
+def registrable_domain(host):
+    """
+    Returns the registrable domain of host, u'example.co.uk' for u'www.Example.co.uk'.
+    """
+    return host_info(host)[1]
+
+def host_cache_stats():
+    """
+    Returns the hit-rate statistics of the cache of host results used by parse_url.
+    """
+    return _host_cache.stats()
+
+def clear_host_cache():
+    _host_cache.clear()
+
+def parse_url(url):
+    """
+    Splits a URL as extracted from a Tweet, with or without a protocol, and returns a dict of
+    its 'scheme' (None without a protocol), 'host', 'port' (None if there is none), 'path',
+    'query' (None if there is none), 'registrable_domain' and 'normalized'. The normalized URL
+    has a lowercase scheme (http when there was none) and host, no default port and a path of
+    at least /.
+    """
+    scheme = None
+    rest = url
+    separator = url.find(u'://')
+    if separator != -1:
+        scheme, rest = url[:separator].lower(), url[separator + 3:]
+    query = None
+    question = rest.find(u'?')
+    if question != -1:
+        rest, query = rest[:question], rest[question + 1:]
+    slash = rest.find(u'/')
+    authority, path = (rest[:slash], rest[slash:]) if slash != -1 else (rest, u'')
+    authority = authority[authority.rfind(u'@') + 1:]
+    port = None
+    colon = authority.rfind(u':')
+    if colon != -1 and authority[colon + 1:].isdigit() and not authority.endswith(u']'):
+        authority, port = authority[:colon], int(authority[colon + 1:])
+    host, domain = host_info(authority)
+
+    normalized_scheme = scheme or u'http'
+    normalized = u'%s://%s' % (normalized_scheme, host)
+    if port is not None and port != DEFAULT_PORTS.get(normalized_scheme):
+        normalized += u':%d' % port
+    normalized += path or u'/'
+    if query is not None:
+        normalized += u'?' + query
+    return {
+        'scheme':               scheme,
+        'host':                 host,
+        'port':                 port,
+        'path':                 path,
+        'query':                query,
+        'registrable_domain':   domain,
+        'normalized':           normalized,
+    }
@@ -0,0 +1,198 @@
+# encoding=utf-8
+
+import codecs, re
+
+from twitter_text.extractor import Extractor
+from twitter_text.offsets import byte_offsets, codepoint_offsets
+from twitter_text.unicode import TwitterTextUnicodeDecodeError
+
+# The UTF-8 encoding of every character that can start an entity. A byte string that contains
+# none of them can't contain any entities and never needs to be decoded.
+TRIGGER_BYTES = tuple(set([char.encode('utf-8') for chars in Extractor.TRIGGERS.values() for char in chars]))
+TRIGGER_PATTERN = re.compile('|'.join([re.escape(trigger) for trigger in TRIGGER_BYTES]))
+
+# No entity contains ASCII whitespace or needs to look past it, except that valid_url_path lets a
+# space follow balanced parentheses, and these bytes never occur inside the encoding of another
+# character, so the buffer can be cut at any of them but a space after a ')'.
+LINE_BREAK_BYTES = '\t\n\r\f\v'
+BREAK_PATTERN = re.compile(r'[\t\n\r\f\v]|(?<!\)) ')
+
+# Regions of the buffer are only cut apart where at least this many bytes have no trigger (the
+# lead byte of the full width triggers standing in for them), so matching doesn't start over for
+# every word.
+REGION_GAP = 64
+_LEAD_BYTES = re.escape(''.join(set([trigger[0] for trigger in TRIGGER_BYTES])))
+# anchored to the start of each stretch, so shorter ones are passed over in a single attempt
+GAP_PATTERN = re.compile('(?:^|(?<=[%s]))[^%s]{%d,}' % (_LEAD_BYTES, _LEAD_BYTES, REGION_GAP))
+
+# re can't search a memoryview, so one is copied this many bytes at a time to find the regions
+WINDOW_SIZE = 64 * 1024
+
+class Utf8Extractor(object):
+    """
+    Extracts entities from a UTF-8 encoded buffer, either a str or a memoryview of one, such as
+    a message read from a log. Indices are byte offsets into the buffer and the entity values
+    are slices of it, so nothing has to be re-encoded to cut entities out of the payload and
+    a memoryview's slices share its memory.
+
+    The patterns in REGEXEN work on unicode, so the regions of the buffer around trigger
+    characters are decoded, each once for all the extract methods, and the long stretches
+    without triggers between them never are. Byte offsets are counted within each region, and
+    invalid UTF-8 outside the regions is never seen. A memoryview is searched for the regions
+    a window of WINDOW_SIZE bytes at a time, so it is never copied whole.
+    """
+
+    def __init__(self, buf):
+        self.buf = buf
+        self._regions = None
+
+    @property
+    def regions(self):
+        """
+        The start and end byte offsets and an Extractor of the decoded text of every region of
+        the buffer that may contain entities.
+        """
+        if self._regions is None:
+            regions = []
+            for start, end in self._find_regions():
+                try:
+                    text = codecs.utf_8_decode(self.buf[start:end], 'strict', True)[0]
+                except UnicodeDecodeError, e:
+                    raise TwitterTextUnicodeDecodeError(self.buf, e.encoding, e.object, e.start, e.end,
+                        '%s at byte %d of the buffer' % (e.reason, start + e.start))
+                regions.append((start, end, Extractor(text)))
+            self._regions = regions
+        return self._regions
+
+    def _find_regions(self):
+        if isinstance(self.buf, (str, bytearray)):
+            return self._scan(self.buf, True)[0]
+        regions = []
+        offset = 0
+        size = WINDOW_SIZE
+        length = len(self.buf)
+        while True:
+            end = min(offset + size, length)
+            found, start = self._scan(self.buf[offset:end].tobytes(), end == length)
+            regions.extend([(offset + region_start, offset + region_end) for region_start, region_end in found])
+            if end == length:
+                return regions
+            if start:
+                # the next window starts at a break, which _scan passes over like a region start
+                offset += start
+                size = WINDOW_SIZE
+            else:
+                # nothing could be cut in this window, so it is searched again twice the size
+                size *= 2
+
+    def _scan(self, data, final):
+        # Returns the regions of data and where the last one starts. Unless data is the end of
+        # the buffer, only the stretches it has whole are cut, and a stretch that runs past its
+        # end is cut leaving at least REGION_GAP bytes of it, so the next window sees the rest of
+        # it as a stretch of its own and cuts it the same way a single search would.
+        regions = []
+        start = 0
+        # the buffer is cut in the stretches without triggers, between the first and the last
+        # break in each, since the patterns look at the character on either side of a match
+        for gap in GAP_PATTERN.finditer(data):
+            whole = final or gap.end() < len(data)
+            end = gap.end() if whole else len(data) - REGION_GAP + 1
+            first = BREAK_PATTERN.search(data, gap.start(), end)
+            if first is None:
+                if whole:
+                    continue
+                break
+            if gap.start() > 0:
+                regions.append((start, first.start() + 1))
+            start = self._last_break(data, first.start(), end)
+            if not whole:
+                break
+        if final and TRIGGER_PATTERN.search(data, start):
+            regions.append((start, len(data)))
+        return regions, start
+
+    def _last_break(self, data, position, end):
+        # the last break at or after position and before end, position itself if there is none
+        last = max([data.rfind(char, position, end) for char in LINE_BREAK_BYTES])
+        space = data.rfind(' ', max(last, position), end)
+        while space > 0 and data[space - 1] == ')':
+            space = data.rfind(' ', max(last, position), space)
+        return max(last, space, position)
+
+    def _extract(self, method, *args):
+        entities = []
+        for start, end, extractor in self.regions:
+            entities.extend(self._to_bytes(getattr(extractor, method)(*args), start, end, extractor.text))
+        return entities
+
+    def extract_entities_with_indices(self, options = {}):
+        return self._extract('extract_entities_with_indices', options)
+
+    def extract_mentioned_screen_names_with_indices(self):
+        return self._extract('extract_mentioned_screen_names_with_indices')
+
+    def extract_mentions_or_lists_with_indices(self):
+        return self._extract('extract_mentions_or_lists_with_indices')
+
+    def extract_urls_with_indices(self, options = {'extract_url_without_protocol': True}):
+        return self._extract('extract_urls_with_indices', options)
+
+    def extract_hashtags_with_indices(self, options = {'check_url_overlap': True}):
+        return self._extract('extract_hashtags_with_indices', options)
+
+    def extract_cashtags_with_indices(self):
+        return self._extract('extract_cashtags_with_indices')
+
+    def to_codepoint_indices(self, entities):
+        """
+        Returns copies of entities returned by this object with their byte offsets converted
+        to code point offsets. The buffer is scanned once for all of them.
+        """
+        offsets = []
+        for entity in entities:
+            offsets.extend(entity['indices'])
+        offsets = codepoint_offsets(self.buf, offsets)
+        converted = []
+        for entity in entities:
+            entity = dict(entity)
+            entity['indices'] = [offsets[entity['indices'][0]], offsets[entity['indices'][1]]]
+            converted.append(entity)
+        return converted
+
+    def _to_bytes(self, entities, start, end, text):
+        if len(text) == end - start:
+            # pure ASCII, indices are already byte offsets from the start of the region
+            offsets = None
+        else:
+            # the entity symbols (#, @, $) are all a single character
+            indices = []
+            for entity in entities:
+                indices.extend(entity['indices'])
+                indices.append(entity['indices'][0] + 1)
+            offsets = byte_offsets(text, indices)
+
+        region_start = start
+        buf = self.buf
+        converted = []
+        for entity in entities:
+            start, end = entity['indices']
+            after_symbol = start + 1
+            if offsets is not None:
+                start, end, after_symbol = offsets[start], offsets[end], offsets[after_symbol]
+            start, end, after_symbol = region_start + start, region_start + end, region_start + after_symbol
+            if 'url' in entity:
+                entity = {'url': buf[start:end]}
+            elif 'hashtag' in entity:
+                entity = {'hashtag': buf[after_symbol:end]}
+            elif 'cashtag' in entity:
+                entity = {'cashtag': buf[after_symbol:end]}
+            elif 'screen_name' in entity:
+                # screen names and list slugs are ASCII so their lengths are byte lengths
+                name_end = after_symbol + len(entity['screen_name'])
+                converted_entity = {'screen_name': buf[after_symbol:name_end]}
+                if 'list_slug' in entity:
+                    converted_entity['list_slug'] = buf[name_end:end] if entity['list_slug'] else ''
+                entity = converted_entity
+            entity['indices'] = [start, end]
+            converted.append(entity)
+        return converted
@@ -1,49 +1,31 @@
 # encoding=utf-8
 
 import re
+from bisect import bisect_left
 
-from twitter_text.unicode import force_unicode
+from twitter_text.cache import cached, options_key, LRUCache
+from twitter_text.unicode import force_unicode, nfc_with_positions
 from twitter_text.extractor import Extractor
+from twitter_text.offsets import OffsetMap
 from twitter_text.regex import REGEXEN
+from twitter_text.weighting import CONFIGS, DEFAULT_CONFIG, get_config
 
-MAX_LENGTH = 280
+MAX_LENGTH = CONFIGS[DEFAULT_CONFIG].max_length
 
-DEFAULT_TCO_URL_LENGTHS = {
-  'short_url_length': 23,
-  'short_url_length_https': 23,
-  'characters_reserved_per_media': 0,
-}
+# Checking a URL's authority is the expensive part of valid_url and the same hosts come up over
+# and over, so the results are kept for the most recently seen ones. Longer authorities are
+# always checked, so the cache stays small.
+AUTHORITY_CACHE_SIZE = 4096
+MAX_CACHED_AUTHORITY_LENGTH = 256
 
-WEIGHTS = {
-    'scale': 100,
-    'default_weight': 200,
-    'ranges': [
-        {
-            'start': 0,
-            'end': 4351,
-            'weight': 100
-        },
-        {
-            'start': 8192,
-            'end': 8205,
-            'weight': 100
-        },
-        {
-            'start': 8208,
-            'end': 8223,
-            'weight': 100
-        },
-        {
-            'start': 8242,
-            'end': 8247,
-            'weight': 100
-        }
-    ]
-}
+# The default configuration's settings, see twitter_text.weighting for the others
+DEFAULT_TCO_URL_LENGTHS = CONFIGS[DEFAULT_CONFIG].url_lengths
+WEIGHTS = CONFIGS[DEFAULT_CONFIG].weights
 
 class Validation(object):
     def __init__(self, text, **kwargs):
-        self.text = force_unicode(text)
+        self.analysis = kwargs.get('analysis')
+        self.text = self.analysis.text if self.analysis is not None else force_unicode(text)
         self.parent = kwargs.get('parent', False)
 
     def tweet_length(self, options = {}):
@@ -59,6 +41,7 @@ class Validation(object):
              … The NFC of {U+0065, U+0301} is {U+00E9}, which is a single chracter and a +display_length+ of 1
 
          The string could also contain U+00E9 already, in which case the canonicalization will not change the value.
+         Text that passes the NFC quick check, such as anything ASCII or Latin-1, isn't normalized at all.
 
         After NFC normalization, all characters in the tweet are weighted against a set of twitter rules that define
         relative weights for different ranges of characters as defined here:
@@ -66,40 +49,75 @@ class Validation(object):
         https://developer.twitter.com/en/docs/developer-utilities/twitter-text.html
 
         Finally, every url is extracted and counted as a fixed number of characters
+
+        options['config'] picks the weighting configuration by name ('v1' for the classic 140 count,
+        'v2', the default, or 'v3' which counts every emoji sequence as one default-weight character
+        (2)) or is a twitter_text.weighting.WeightingConfig. Its URL lengths apply unless options set
+        them.
+
+        If the URLs are already known, pass them as options['entities'] to skip extracting them: a list
+        of entities (only the ones with a 'url' are used) or an API style dict with a 'urls' list. Their
+        indices are Python string indices unless options['index_unit'] is 'utf16' or 'codepoint'. An
+        analysis given entities with TextAnalysis.provide_entities is used the same way. Either has to
+        hold the URLs extract_urls_with_indices() would find for the result to be the same.
         """
 
         assert (not self.parent or not getattr(self.parent, 'has_been_linked', False) ), 'The validator should only be run on text before it has been modified.'
 
-        for key in DEFAULT_TCO_URL_LENGTHS:
+        config = get_config(options.get('config'))
+        for key in config.url_lengths:
             if not key in options:
-                options[key] = DEFAULT_TCO_URL_LENGTHS[key]
-
-        collective_weight = 0
-        for char in self.text:
-            codepoint = ord(char)
-            char_weight = WEIGHTS['default_weight']
-            if codepoint >= 0xd800 and codepoint <= 0xdbff:
-                # This is a surrogate character, don't count it
-                char_weight = 0
-            else:
-                for rng in WEIGHTS['ranges']:
-                    if rng['start'] <= codepoint <= rng['end']:
-                        char_weight = rng['weight']
-            collective_weight = collective_weight + char_weight
-
-        length = collective_weight / WEIGHTS['scale']
-
-        for url in Extractor(self.text).extract_urls_with_indices():
+                options[key] = config.url_lengths[key]
+
+        key = options_key(options)
+        if self.analysis is not None and self.analysis.provided_entities is not None:
+            # the result cache is keyed on the text alone, not on the URLs it was given
+            compute = lambda: self._tweet_length(options)
+        else:
+            compute = lambda: cached('tweet_length', self.text, options, lambda: self._tweet_length(options))
+        if self.analysis is not None and key is not None:
+            length = self.analysis.memoize(('tweet_length', key), compute)
+        else:
+            length = compute()
+
+        if self.parent and hasattr(self.parent, 'tweet_length'):
+            self.parent.tweet_length = length
+        return length
+
+    def _tweet_length(self, options = {}):
+        config = get_config(options.get('config'))
+        if self.analysis is not None:
+            normalized, positions = self.analysis.memoize('nfc', lambda: nfc_with_positions(self.text))
+            collective_weight = self.analysis.memoize(('collective_weight', config), lambda: self._collective_weight(normalized, config))
+        else:
+            normalized, positions = nfc_with_positions(self.text)
+            collective_weight = self._collective_weight(normalized, config)
+
+        length = collective_weight / config.scale
+
+        # URLs are found in the original text, so their indices are mapped to the normalized one
+        for url in self._url_entities(options):
+            start, end = url['indices']
+            if positions is not None:
+                start, end = bisect_left(positions, start), bisect_left(positions, end)
             # remove the link of the original URL
-            length += url['indices'][0] - url['indices'][1]
+            length += start - end
             # add the length of the t.co URL that will replace it
             length += options.get('short_url_length_https') if url['url'].lower().find('https://') > -1 else options.get('short_url_length')
 
-        if self.parent and hasattr(self.parent, 'tweet_length'):
-            self.parent.tweet_length = length
         return length
 
-    def tweet_invalid(self):
+    def _url_entities(self, options):
+        if options.get('entities') is not None:
+            return url_entities(self.text, options['entities'], options.get('index_unit', 'python'))
+        if self.analysis is not None and self.analysis.provided_entities is not None:
+            return self.analysis.provided_entities
+        return Extractor(self.text, analysis = self.analysis).extract_urls_with_indices()
+
+    def _collective_weight(self, text = None, config = None):
+        return get_config(config).weight(self.text if text is None else text)
+
+    def tweet_invalid(self, options = {}):
         """
         Check the text for any reason that it may not be valid as a Tweet. This is meant as a pre-validation
         before posting to api.twitter.com. There are several server-side reasons for Tweets to fail but this pre-validation
@@ -110,15 +128,20 @@ class Validation(object):
             "Too long":: if the text is too long
             "Empty text":: if the text is empty
             "Invalid characters":: if the text contains non-Unicode or any of the disallowed Unicode characters
+
+        The options are passed to tweet_length, and the maximum length is that of options['config'].
         """
 
         valid = True # optimism
         validation_error = None
 
-        if not self.tweet_length():
+        options = dict(options)
+        length = self.tweet_length(options)
+
+        if not length:
             valid, validation_error = False, 'Empty text'
 
-        if self.tweet_length() > MAX_LENGTH:
+        if length > get_config(options.get('config')).max_length:
             valid, validation_error = False, 'Too long'
 
         if re.search(ur''.join(REGEXEN['invalid_control_characters']), self.text):
@@ -134,72 +157,220 @@ class Validation(object):
     def valid_tweet_text(self):
         return not self.tweet_invalid()
 
+    def username_invalid(self):
+        """
+        Check that the text is a single username mention, like @jack.
+
+        Returns false if it is. Otherwise one of the following Symbols will be returned:
+
+            "Empty text":: if the text is empty
+            "Missing at sign":: if the text doesn't start with @
+            "Empty name":: if there is nothing after the @
+            "Too long":: if the screen name is longer than 20 characters
+            "Invalid characters":: if the screen name has characters other than letters, numbers and _
+            "Starts with http":: if the screen name starts with http, which extraction never returns
+        """
+        return _username_invalid(self.text)
+
     def valid_username(self):
-        if not self.text:
-            return False
+        return not self.username_invalid()
 
-        extracted = Extractor(self.text).extract_mentioned_screen_names()
+    def list_invalid(self):
+        """
+        Check that the text is a single list mention, like @jack/friends.
 
-        return len(extracted) == 1 and extracted[0] == self.text[1:]
+        Returns false if it is. Otherwise "Empty text", "Missing list name" or "Invalid characters".
+        """
+        return _list_invalid(self.text)
 
     def valid_list(self):
-        match = re.compile(ur'^%s$' % REGEXEN['valid_mention_or_list'].pattern).search(self.text)
-        return bool(match is not None and match.groups()[0] == "" and match.groups()[3])
+        return not self.list_invalid()
+
+    def hashtag_invalid(self):
+        """
+        Check that the text is a single hashtag, like #twitter.
+
+        Returns false if it is. Otherwise one of the following Symbols will be returned:
+
+            "Empty text":: if the text is empty
+            "Missing hash sign":: if the text doesn't start with #
+            "Empty hashtag":: if there is nothing after the #
+            "Numbers only":: if the hashtag is all numbers
+            "Invalid characters":: if the hashtag has characters that can't be part of one
+            "Starts with http":: if the hashtag starts with http, which extraction never returns
+        """
+        return _hashtag_invalid(self.text)
 
     def valid_hashtag(self):
-        if not self.text:
-            return False
+        return not self.hashtag_invalid()
 
-        extracted = Extractor(self.text).extract_hashtags()
+    def url_invalid(self, unicode_domains = True, require_protocol = True):
+        """
+        Check that the text is a valid http or https URL.
 
-        return len(extracted) == 1 and extracted[0] == self.text[1:]
+        Returns false if it is. Otherwise one of "Empty text", "Malformed", "Invalid scheme",
+        "Invalid authority", "Invalid path", "Invalid query" or "Invalid fragment" is returned,
+        naming the first part of the URL that failed. Authority results are cached, see
+        authority_cache_stats.
+        """
+        return _url_invalid(self.text, unicode_domains, require_protocol)
 
     def valid_url(self, unicode_domains = True, require_protocol = True):
-        if not self.text:
-            return False
-
-        url_parts = REGEXEN['validate_url_unencoded'].match(self.text)
-
-        if not (url_parts and url_parts.string == self.text):
-            return False
-
-        scheme, authority, path, query, fragment = url_parts.groups()
-
-        if not (
-            (
-                not require_protocol
-                or (
-                    self._valid_match(scheme, REGEXEN['validate_url_scheme'])
-                    and re.compile(ur'^https?$', re.IGNORECASE).match(scheme)
-                )
-            )
-            and (
-                path == ''
-                or self._valid_match(path, REGEXEN['validate_url_path'])
-            )
-            and self._valid_match(query, REGEXEN['validate_url_query'], True)
-            and self._valid_match(fragment, REGEXEN['validate_url_fragment'], True)
-        ):
-            return False
-
-        return bool(
-            (
-                unicode_domains
-                and self._valid_match(authority, REGEXEN['validate_url_unicode_authority'])
-                and REGEXEN['validate_url_unicode_authority'].match(authority).string == authority
-            )
-            or (
-                not unicode_domains
-                and self._valid_match(authority, REGEXEN['validate_url_authority'])
-                and REGEXEN['validate_url_authority'].match(authority).string == authority
-            )
-        )
+        return not self.url_invalid(unicode_domains, require_protocol)
 
     def _valid_match(self, string, re_obj, optional = False):
-        if optional and string is None:
-            return True
-        match = re_obj.match(string)
-        if optional:
-            return not (string and (match is None or not match.string[match.span()[0]:match.span()[1]] == string))
-        else:
-            return bool(string and match and match.string[match.span()[0]:match.span()[1]] == string)
+        return _valid_match(string, re_obj, optional)
+
+def url_entities(text, entities, index_unit = 'python'):
+    """
+    Returns the URL entities from a list of entities or an API style dict of them with their
+    indices converted from index_unit to Python string indices into text.
+    """
+    if isinstance(entities, dict):
+        entities = entities.get('urls') or []
+    urls = [entity for entity in entities if 'url' in entity]
+    if index_unit == 'python':
+        return urls
+    offset_map = OffsetMap(text)
+    converted = []
+    for url in urls:
+        url = dict(url)
+        url['indices'] = [offset_map.to_python(url['indices'][0], index_unit), offset_map.to_python(url['indices'][1], index_unit)]
+        converted.append(url)
+    return converted
+
+def _valid_match(string, re_obj, optional = False):
+    if optional and string is None:
+        return True
+    match = re_obj.match(string)
+    if optional:
+        return not (string and (match is None or not match.string[match.span()[0]:match.span()[1]] == string))
+    else:
+        return bool(string and match and match.string[match.span()[0]:match.span()[1]] == string)
+
+def _username_invalid(text):
+    if not text:
+        return 'Empty text'
+    match = REGEXEN['valid_username'].match(text)
+    if match is None:
+        if not REGEXEN['at_signs'].match(text):
+            return 'Missing at sign'
+        if len(text) == 1:
+            return 'Empty name'
+        if len(text) > 21 and not re.search(ur'[^a-zA-Z0-9_]', text[1:]):
+            return 'Too long'
+        return 'Invalid characters'
+    if match.group(1).find('http') == 0:
+        return 'Starts with http'
+    return False
+
+def _list_invalid(text):
+    if not text:
+        return 'Empty text'
+    match = REGEXEN['valid_list'].search(text)
+    if match is None or match.groups()[0] != "":
+        return 'Invalid characters'
+    if not match.groups()[3]:
+        return 'Missing list name'
+    return False
+
+def _hashtag_invalid(text):
+    if not text:
+        return 'Empty text'
+    match = REGEXEN['valid_hashtag_token'].match(text)
+    if match is None:
+        if text[0] not in u'#＃':
+            return 'Missing hash sign'
+        if len(text) == 1:
+            return 'Empty hashtag'
+        if REGEXEN['numeric_only'].match(text[1:]):
+            return 'Numbers only'
+        return 'Invalid characters'
+    hashtag = match.group(1)
+    if hashtag.find('http') == 0:
+        return 'Starts with http'
+    if REGEXEN['numeric_only'].match(hashtag):
+        return 'Numbers only'
+    return False
+
+def _url_invalid(text, unicode_domains = True, require_protocol = True):
+    if not text:
+        return 'Empty text'
+
+    url_parts = REGEXEN['validate_url_unencoded'].match(text)
+    if not (url_parts and url_parts.string == text):
+        return 'Malformed'
+
+    scheme, authority, path, query, fragment = url_parts.groups()
+
+    if require_protocol and not (
+        scheme is not None
+        and _valid_match(scheme, REGEXEN['validate_url_scheme'])
+        and REGEXEN['validate_url_http_scheme'].match(scheme)
+    ):
+        return 'Invalid scheme'
+    if not _valid_authority(authority, unicode_domains):
+        return 'Invalid authority'
+    if not (path == '' or _valid_match(path, REGEXEN['validate_url_path'])):
+        return 'Invalid path'
+    if not _valid_match(query, REGEXEN['validate_url_query'], True):
+        return 'Invalid query'
+    if not _valid_match(fragment, REGEXEN['validate_url_fragment'], True):
+        return 'Invalid fragment'
+    return False
+
+_authority_cache = LRUCache(AUTHORITY_CACHE_SIZE)
+
+def _valid_authority(authority, unicode_domains):
+    if len(authority) > MAX_CACHED_AUTHORITY_LENGTH:
+        return _valid_match(authority, REGEXEN['validate_url_unicode_authority' if unicode_domains else 'validate_url_authority'])
+    key = (authority, bool(unicode_domains))
+    valid = _authority_cache.get(key)
+    if valid is None:
+        valid = _valid_match(authority, REGEXEN['validate_url_unicode_authority' if unicode_domains else 'validate_url_authority'])
+        _authority_cache.set(key, valid)
+    return valid
+
+def authority_cache_stats():
+    """
+    Returns the hit-rate statistics of the cache of URL authority results used by valid_url.
+    """
+    return _authority_cache.stats()
+
+def clear_authority_cache():
+    _authority_cache.clear()
+
+VALIDATORS = {
+    'username': _username_invalid,
+    'list':     _list_invalid,
+    'hashtag':  _hashtag_invalid,
+    'url':      _url_invalid,
+}
+
+def bulk_validate(candidates, kind, **kwargs):
+    """
+    Validates every candidate as a 'username', 'list', 'hashtag' or 'url' in one call, without
+    building a Validation for each. Returns a list of booleans and a list of the reasons the
+    invalid ones failed (see username_invalid and friends), None for the valid ones:
+
+        bulk_validate([u'@jack', u'@', u'jack'], 'username')
+        # [True, False, False], [None, 'Empty name', 'Missing at sign']
+
+    unicode_domains and require_protocol are passed through for URLs, see also validate_urls.
+    """
+    if kind not in VALIDATORS:
+        raise ValueError('Unknown validation %r, expected one of %s' % (kind, ', '.join(sorted(VALIDATORS.keys()))))
+    invalid = VALIDATORS[kind]
+    valid, reasons = [], []
+    for candidate in candidates:
+        reason = invalid(force_unicode(candidate), **kwargs)
+        valid.append(not reason)
+        reasons.append(reason or None)
+    return valid, reasons
+
+def validate_urls(urls, unicode_domains = True, require_protocol = True):
+    """
+    Validates a sequence of URLs as Validation(url).valid_url would and returns a list of
+    booleans and a list of the reasons the invalid ones failed, None for the valid ones.
+    """
+    return bulk_validate(urls, 'url', unicode_domains = unicode_domains, require_protocol = require_protocol)
@@ -0,0 +1,201 @@
+# encoding=utf-8
+
+# Versioned rules for weighing the characters of a Tweet. Each configuration is compiled once
+# into a regular expression per weight, so weighing a text is a few scans in C whichever
+# configuration a call picks.
+import re, sys
+
+NARROW_BUILD = sys.maxunicode == 0xffff
+
+# High surrogates never count, so a character outside the Basic Multilingual Plane weighs what
+# its low surrogate does on narrow builds and what its code point does on wide ones.
+SURROGATE_RANGE = (0xd800, 0xdbff)
+
+def _escape(codepoint):
+    return (u'\\u%04x' % codepoint if codepoint <= 0xffff else u'\\U%08x' % codepoint).decode('unicode-escape')
+
+def _bmp_class(ranges):
+    return u'[%s]' % u''.join([
+        re.escape(_escape(start)) if start == end else u'%s-%s' % (re.escape(_escape(start)), re.escape(_escape(end))) for start, end in ranges
+    ])
+
+def char_class(ranges):
+    """
+    Returns a pattern matching one character in any of the (start, end) code point ranges. On
+    narrow builds the characters outside the Basic Multilingual Plane are matched as surrogate
+    pairs.
+    """
+    bmp = [(start, min(end, 0xffff)) for start, end in ranges if start <= 0xffff]
+    astral = [(max(start, 0x10000), end) for start, end in ranges if end > 0xffff]
+    if not NARROW_BUILD:
+        return _bmp_class(bmp + astral)
+    alternatives = bmp and [_bmp_class(bmp)] or []
+    for start, end in astral:
+        start, end = start - 0x10000, end - 0x10000
+        high_start, high_end = 0xd800 + (start >> 10), 0xd800 + (end >> 10)
+        low_start, low_end = 0xdc00 + (start & 0x3ff), 0xdc00 + (end & 0x3ff)
+        if high_start == high_end:
+            alternatives.append(_escape(high_start) + _bmp_class([(low_start, low_end)]))
+            continue
+        alternatives.append(_escape(high_start) + _bmp_class([(low_start, 0xdfff)]))
+        if high_start + 1 < high_end:
+            alternatives.append(_bmp_class([(high_start + 1, high_end - 1)]) + _bmp_class([(0xdc00, 0xdfff)]))
+        alternatives.append(_escape(high_end) + _bmp_class([(0xdc00, low_end)]))
+    return u'(?:%s)' % u'|'.join(alternatives)
+
+# Emoji sequences for the configurations that count each one as a single character. Pictographs
+# outside the BMP are always emoji; the symbols in the BMP only when they default to emoji
+# presentation or are followed by VS16 or a skin tone modifier.
+REGIONAL_INDICATOR = char_class([(0x1f1e6, 0x1f1ff)])
+EMOJI_MODIFIER = char_class([(0x1f3fb, 0x1f3ff)])
+EMOJI_PICTOGRAPH = char_class([(0x1f000, 0x1f1e5), (0x1f200, 0x1faff)])
+EMOJI_PRESENTATION_SYMBOLS = [
+    (0x231a, 0x231b), (0x23e9, 0x23ec), (0x23f0, 0x23f0), (0x23f3, 0x23f3), (0x25fd, 0x25fe), (0x2614, 0x2615),
+    (0x2648, 0x2653), (0x267f, 0x267f), (0x2693, 0x2693), (0x26a1, 0x26a1), (0x26aa, 0x26ab), (0x26bd, 0x26be),
+    (0x26c4, 0x26c5), (0x26ce, 0x26ce), (0x26d4, 0x26d4), (0x26ea, 0x26ea), (0x26f2, 0x26f3), (0x26f5, 0x26f5),
+    (0x26fa, 0x26fa), (0x26fd, 0x26fd), (0x2705, 0x2705), (0x270a, 0x270b), (0x2728, 0x2728), (0x274c, 0x274c),
+    (0x274e, 0x274e), (0x2753, 0x2755), (0x2757, 0x2757), (0x2795, 0x2797), (0x27b0, 0x27b0), (0x27bf, 0x27bf),
+    (0x2b1b, 0x2b1c), (0x2b50, 0x2b50), (0x2b55, 0x2b55),
+]
+EMOJI_PRESENTATION_SYMBOL = char_class(EMOJI_PRESENTATION_SYMBOLS)
+EMOJI_TEXT_SYMBOLS = [
+    (0xa9, 0xa9), (0xae, 0xae), (0x203c, 0x203c), (0x2049, 0x2049), (0x2122, 0x2122), (0x2139, 0x2139),
+    (0x2194, 0x2199), (0x21a9, 0x21aa), (0x2328, 0x2328), (0x23cf, 0x23cf), (0x23ed, 0x23ef), (0x23f1, 0x23f2),
+    (0x23f8, 0x23fa), (0x24c2, 0x24c2), (0x25aa, 0x25ab), (0x25b6, 0x25b6), (0x25c0, 0x25c0), (0x25fb, 0x25fc),
+    (0x2600, 0x27bf), (0x2934, 0x2935), (0x2b05, 0x2b07), (0x3030, 0x3030), (0x303d, 0x303d), (0x3297, 0x3297),
+    (0x3299, 0x3299),
+]
+EMOJI_TEXT_SYMBOL = char_class(EMOJI_TEXT_SYMBOLS)
+EMOJI_ELEMENT = ur'(?:%s%s?\ufe0f?|%s(?:%s|\ufe0f)?|%s(?:\ufe0f%s?|%s))' % (
+    EMOJI_PICTOGRAPH, EMOJI_MODIFIER,
+    EMOJI_PRESENTATION_SYMBOL, EMOJI_MODIFIER,
+    EMOJI_TEXT_SYMBOL, EMOJI_MODIFIER, EMOJI_MODIFIER,
+)
+EMOJI_SEQUENCE = re.compile(ur'%s%s|[0-9#*]\ufe0f?\u20e3|%s%s+%s|%s(?:\u200d(?:%s|%s\ufe0f?))*' % (
+    # flags, then keycaps (no arguments) and subdivision flags (tag sequences)
+    REGIONAL_INDICATOR, REGIONAL_INDICATOR,
+    char_class([(0x1f3f4, 0x1f3f4)]), char_class([(0xe0020, 0xe007e)]), char_class([(0xe007f, 0xe007f)]),
+    # an emoji, optionally joined to more of them by zero width joiners
+    EMOJI_ELEMENT, EMOJI_ELEMENT, EMOJI_TEXT_SYMBOL,
+), re.UNICODE)
+# Every emoji sequence contains one of these, and most text none, so it is searched for first
+EMOJI_HINT = re.compile(char_class([(0x20e3, 0x20e3), (0x1f000, 0x1faff), (0xe0020, 0xe007f)] + EMOJI_PRESENTATION_SYMBOLS + EMOJI_TEXT_SYMBOLS))
+
+class WeightingConfig(object):
+    """
+    A named version of the weighing rules: the weight of each range of code points (and of
+    everything else), the scale that turns the total into a length, the maximum length, the
+    length a URL counts as once shortened and whether emoji sequences count as one
+    default-weight character (2 in v3).
+
+    The weights and url_lengths attributes have the layout of the old WEIGHTS and
+    DEFAULT_TCO_URL_LENGTHS dicts. Treat configurations as immutable; make a new one instead.
+    """
+
+    def __init__(self, version, max_length, scale, default_weight, ranges = [], url_length = 23, emoji_parsing = False):
+        self.version = version
+        self.max_length = max_length
+        self.scale = scale
+        self.default_weight = default_weight
+        self.emoji_parsing = emoji_parsing
+        self.weights = {'scale': scale, 'default_weight': default_weight, 'ranges': ranges}
+        self.url_lengths = {
+            'short_url_length': url_length,
+            'short_url_length_https': url_length,
+            'characters_reserved_per_media': 0,
+        }
+        self._classes = self._compile(ranges)
+
+    def __repr__(self):
+        return '<WeightingConfig %s>' % self.version
+
+    def _compile(self, ranges):
+        # resolve the ranges into disjoint ones, later ranges winning like they used to
+        boundaries = set([SURROGATE_RANGE[0], SURROGATE_RANGE[1] + 1])
+        for rng in ranges:
+            boundaries.update([rng['start'], rng['end'] + 1])
+        boundaries = sorted(boundaries)
+        by_weight = {}
+        for start, end in zip(boundaries, boundaries[1:]):
+            end -= 1
+            if start > sys.maxunicode:
+                break
+            end = min(end, sys.maxunicode)
+            if SURROGATE_RANGE[0] <= start and end <= SURROGATE_RANGE[1]:
+                weight = 0
+            else:
+                weight = self.default_weight
+                for rng in ranges:
+                    if rng['start'] <= start and end <= rng['end']:
+                        weight = rng['weight']
+            if weight != self.default_weight:
+                by_weight.setdefault(weight, []).append((start, end))
+        return [(weight - self.default_weight, re.compile(u'%s+' % _bmp_class(spans))) for weight, spans in sorted(by_weight.items())]
+
+    def weight(self, text):
+        """
+        Returns the total weight of the characters in text.
+        """
+        total = self._weight(text)
+        if self.emoji_parsing and EMOJI_HINT.search(text):
+            for match in EMOJI_SEQUENCE.finditer(text):
+                total += self.default_weight - self._weight(match.group(0))
+        return total
+
+    def char_weights(self, text):
+        """
+        Returns the weight of every character of text, in a list as long as it. With emoji parsing
+        the first character of each emoji sequence carries the weight of the whole sequence and
+        the rest weigh nothing.
+        """
+        weights = [self.default_weight] * len(text)
+        for difference, pattern in self._classes:
+            for match in pattern.finditer(text):
+                for index in xrange(match.start(), match.end()):
+                    weights[index] += difference
+        if self.emoji_parsing and EMOJI_HINT.search(text):
+            for match in EMOJI_SEQUENCE.finditer(text):
+                start, end = match.span()
+                weights[start:end] = [self.default_weight] + [0] * (end - start - 1)
+        return weights
+
+    def _weight(self, text):
+        total = self.default_weight * len(text)
+        for difference, pattern in self._classes:
+            for run in pattern.findall(text):
+                total += difference * len(run)
+        return total
+
+# The ranges of the weighted configurations: Latin-1 and the scripts up to U+10FF plus some
+# general punctuation count as half as much as everything else.
+WEIGHTED_RANGES = [
+    {'start': 0, 'end': 4351, 'weight': 100},
+    {'start': 8192, 'end': 8205, 'weight': 100},
+    {'start': 8208, 'end': 8223, 'weight': 100},
+    {'start': 8242, 'end': 8247, 'weight': 100},
+]
+
+CONFIGS = {
+    # every code point counts as one character, up to 140
+    'v1': WeightingConfig('v1', 140, 1, 1),
+    # the weighted count, up to 280
+    'v2': WeightingConfig('v2', 280, 100, 200, WEIGHTED_RANGES),
+    # the weighted count with every emoji sequence counting as one heavy character
+    'v3': WeightingConfig('v3', 280, 100, 200, WEIGHTED_RANGES, emoji_parsing = True),
+}
+
+DEFAULT_CONFIG = 'v2'
+
+def get_config(config = None):
+    """
+    Returns the WeightingConfig called config ('v1', 'v2' or 'v3'), config itself if it is
+    already one, or the default configuration if it is None.
+    """
+    if config is None:
+        config = DEFAULT_CONFIG
+    if isinstance(config, WeightingConfig):
+        return config
+    try:
+        return CONFIGS[config]
+    except KeyError:
+        raise ValueError('Unknown weighting configuration %r, expected one of %s' % (config, ', '.join(sorted(CONFIGS.keys()))))